@@ -0,0 +1,106 @@
+"""
+Recall vs latency report for the CandidateDB index types.
+
+Builds every index type over the same vectors, then measures recall@k against
+exact search, single-query p50/p99 latency, memory per vector and build time
+for a sweep of nprobe (IVF) / efSearch (HNSW) values.
+
+    # synthetic clustered vectors (768-d like all-mpnet-base-v2)
+    python -m benchmarks.ann_report --n 200000 --dim 768
+    # real chunk vectors from the embedding cache
+    python -m benchmarks.ann_report --vectors-file cache/embeddings/<model>-norm/vectors.f32 --dim 768
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.rag.ann_index import IndexConfig, create_index, memory_per_vector, search_params
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_vectors(path: str, dim: int, limit: int = None) -> np.ndarray:
+    vectors = np.fromfile(path, dtype=np.float32).reshape(-1, dim)
+    return np.ascontiguousarray(vectors[:limit] if limit else vectors)
+
+
+def measure(index, queries, ground_truth, k, params):
+    latencies, hits = [], 0
+    for q, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        _, found = index.search(q[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(truth))
+    latencies = np.array(latencies) * 1000
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--vectors-file", help="float32 vectors (e.g. the embedding cache)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    if args.vectors_file:
+        vectors = load_vectors(args.vectors_file, args.dim, args.n)
+    else:
+        vectors = synthetic_vectors(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, args.k)
+
+    sweeps = {
+        "flat": [{}],
+        "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "hnsw": [{"ef_search": e} for e in (16, 32, 64, 128)],
+    }
+    report = []
+    for index_type, settings in sweeps.items():
+        config = IndexConfig(index_type=index_type, pq_m=args.pq_m)
+        start = time.perf_counter()
+        index = create_index(config, vectors)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        for setting in settings:
+            row = {
+                "index_type": index_type,
+                **setting,
+                "build_s": round(build_s, 2),
+                "bytes_per_vector": round(memory_per_vector(index), 1),
+                **measure(index, queries, ground_truth, args.k, search_params(index, **setting)),
+            }
+            report.append(row)
+            print(f"{index_type:9s} {str(setting):20s} recall@{args.k}={row['recall']:.3f} "
+                  f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                  f"{row['bytes_per_vector']:.0f} B/vec build={row['build_s']}s")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"n": len(vectors), "dim": vectors.shape[1], "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark: page text normalization vs the old per-character ASCII filter.
+
+Pages come from the PDFs in ./data_source/generative_ai (text layer only),
+falling back to synthetic English/Vietnamese text.
+
+    python -m benchmarks.bench_normalize [--pdf-dir DIR] [--repeat 20]
+"""
+import argparse
+import glob
+import os
+import timeit
+
+from src.rag.text_normalizer import NormalizationPolicy, normalize_text
+
+SYNTHETIC_PAGE = (
+    "Phùng Minh Chí\tKỹ sư phần mềm — Hà Nội\n"
+    "Experience:  Senior Python developer, ﬁnancial services   (2019–2024)\n\n\n"
+    "Skills: Python, FastAPI, LangChain, FAISS, Docker • Kubernetes\n"
+) * 40
+
+
+def old_remove_non_utf8_characters(text):
+    # Implementation replaced by src/rag/text_normalizer.py
+    return ''.join(char for char in text if ord(char) < 128)
+
+
+def load_pages(pdf_dir: str):
+    from langchain_community.document_loaders import PyPDFLoader
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        pages.extend(doc.page_content for doc in PyPDFLoader(path).load())
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default="./data_source/generative_ai")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf_dir) if os.path.isdir(args.pdf_dir) else []
+    if not pages:
+        pages = [SYNTHETIC_PAGE] * 50
+    chars = sum(len(page) for page in pages)
+    print(f"{len(pages)} pages, {chars / len(pages):.0f} chars/page on average")
+
+    candidates = {
+        "old ascii filter": old_remove_non_utf8_characters,
+        "nfkc (default)": normalize_text,
+        "nfc": lambda text: normalize_text(text, NormalizationPolicy(unicode_form="NFC")),
+        "ascii_only": lambda text: normalize_text(text, NormalizationPolicy(ascii_only=True)),
+    }
+    baseline = None
+    for name, fn in candidates.items():
+        seconds = min(timeit.repeat(lambda: [fn(page) for page in pages], number=1, repeat=args.repeat))
+        per_page_us = seconds / len(pages) * 1e6
+        baseline = baseline or per_page_us
+        print(f"{name:18s} {per_page_us:9.1f} us/page  {baseline / per_page_us:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
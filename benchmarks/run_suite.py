@@ -0,0 +1,259 @@
+"""
+Offline ingestion / query benchmark suite.
+
+Generates a synthetic CV corpus, stubs the LLM (FakeCVChatModel) and the
+embedding model, and measures:
+- loader:     Loader.load_dir over PDFs and HTMLs
+- vectorstore: CandidateDB.build_db / add_documents / search
+- extractor:  CVExtractor.extract
+- api:        startup indexing, /upload_cv and /search_candidates
+
+Results are written as JSON and compared with a stored baseline; a metric
+worse than the baseline by more than --tolerance is reported as a regression
+(exit code 1).
+
+    python -m benchmarks.run_suite --cvs 200 --out bench.json
+    python -m benchmarks.run_suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run_suite --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from benchmarks.synthetic import FakeCVChatModel, fake_embeddings, generate_corpus, install_fake_llm
+
+QUERIES = ["python developer with kubernetes", "machine learning engineer pytorch", "data scientist sql spark",
+           "backend developer fastapi", "devops terraform aws", "react typescript frontend"]
+
+
+class Results:
+    def __init__(self) -> None:
+        self.metrics = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = "lower"):
+        self.metrics[name] = {"value": round(float(value), 6), "unit": unit, "better": better}
+        print(f"  {name:45s} {value:12.4f} {unit}")
+
+    def latencies(self, name: str, samples):
+        samples = np.asarray(samples) * 1000
+        self.add(f"{name}.p50_ms", np.percentile(samples, 50), "ms")
+        self.add(f"{name}.p99_ms", np.percentile(samples, 99), "ms")
+
+
+@contextmanager
+def timer():
+    elapsed = {}
+    start = time.perf_counter()
+    yield elapsed
+    elapsed["s"] = time.perf_counter() - start
+
+
+def bench_loader(results: Results, corpus_dir: str, workers: int):
+    from src.rag.file_loader import Loader
+    print("loader")
+    for file_type in ("pdf", "html"):
+        loader = Loader(file_type)
+        files = loader.list_dir(os.path.join(corpus_dir, file_type))
+        with timer() as t:
+            chunks = loader.load_dir(os.path.join(corpus_dir, file_type), workers=workers)
+        results.add(f"loader.{file_type}.files_per_s", len(files) / t["s"], "files/s", "higher")
+        results.add(f"loader.{file_type}.chunks", len(chunks), "chunks", "none")
+    return load_corpus(corpus_dir, workers)
+
+
+def load_corpus(corpus_dir: str, workers: int):
+    from src.rag.file_loader import Loader
+    return Loader("pdf").load_dir(os.path.join(corpus_dir, "pdf"), workers=workers)
+
+
+def bench_vectorstore(results: Results, docs, work_dir: str, queries: int):
+    from src.rag.vectorstore import CandidateDB
+    print("vectorstore")
+    db = CandidateDB(persist_dir=os.path.join(work_dir, "vectorstore"), embedding_model=fake_embeddings())
+    half = len(docs) // 2
+    with timer() as t:
+        db.build_db(docs[:half])
+    results.add("vectorstore.build_db.chunks_per_s", half / t["s"], "chunks/s", "higher")
+    batch = max(1, (len(docs) - half) // 10)
+    samples = []
+    for start in range(half, len(docs), batch):
+        with timer() as t:
+            db.add_documents(docs[start:start + batch])
+        samples.append(t["s"])
+    results.latencies("vectorstore.add_documents", samples)
+    samples = []
+    for i in range(queries):
+        with timer() as t:
+            db.search(QUERIES[i % len(QUERIES)], k=5)
+        samples.append(t["s"])
+    results.latencies("vectorstore.search", samples)
+    db.db = None
+    with timer() as t:
+        db.load_db()
+    results.add("vectorstore.load_db_s", t["s"], "s")
+
+
+def bench_extractor(results: Results, docs, llm_latency: float):
+    from src.rag.cv_extractor import CVExtractor
+    print("extractor")
+    extractor = CVExtractor(FakeCVChatModel(latency=llm_latency), requests_per_minute=10 ** 9)
+    with timer() as t:
+        records = extractor.extract(docs)
+    results.add("extractor.extract.cvs_per_s", len(records) / t["s"], "cvs/s", "higher")
+    results.add("extractor.extract.errors", sum("error" in r for r in records), "records", "lower")
+
+
+def wait_ready(index, timeout: float = 600):
+    """Wait for the startup sync: an empty write is only applied once it is done."""
+    deadline = time.time() + timeout
+    while index.db is None and time.time() < deadline:
+        time.sleep(0.01)
+    index.submit([]).result(timeout=max(0.0, deadline - time.time()))
+
+
+def bench_api(results: Results, work_dir: str, n_cvs: int, uploads: int, queries: int, llm_latency: float):
+    print("api")
+    cwd = os.getcwd()
+    app_dir = os.path.join(work_dir, "app")
+    os.makedirs(app_dir)
+    os.chdir(app_dir)
+    try:
+        # Startup corpus, indexed by the lifespan hook
+        generate_corpus("./data_source/generative_ai", n_cvs, "pdf", seed=1)
+        install_fake_llm(llm_latency)
+        import src.app as app_module
+        from fastapi.testclient import TestClient
+        from src.rag.cv_extractor import CVExtractor
+        from src.rag.index_manager import IndexManager
+
+        app_module.index = IndexManager(data_dir="./data_source/generative_ai", data_type="pdf",
+                                        workers=app_module.pool.processes, pool=app_module.pool,
+                                        embedding_model=fake_embeddings(),
+                                        on_remove=app_module.candidates.delete)
+        app_module.extractor = CVExtractor(app_module.llm, requests_per_minute=10 ** 9)
+        app_module.runner.index = app_module.index
+        app_module.runner.extractor = app_module.extractor
+        upload_paths = generate_corpus("./uploads", uploads, "pdf", seed=2, start=n_cvs)
+
+        start = time.perf_counter()
+        with TestClient(app_module.app) as client:
+            wait_ready(app_module.index)
+            results.add("api.startup_index_s", time.perf_counter() - start, "s")
+
+            samples = []
+            for path in upload_paths:
+                with open(path, "rb") as f:
+                    files = [("file", (os.path.basename(path), f.read(), "application/pdf"))]
+                with timer() as t:
+                    response = client.post("/upload_cv", params={"wait": "true"}, files=files)
+                assert response.status_code == 200, response.text
+                samples.append(t["s"])
+            results.latencies("api.upload_cv", samples)
+
+            samples = []
+            for i in range(queries):
+                with timer() as t:
+                    response = client.post("/search_candidates", json={"query": QUERIES[i % len(QUERIES)]})
+                assert response.status_code == 200, response.text
+                samples.append(t["s"])
+            results.latencies("api.search_candidates", samples)
+    finally:
+        os.chdir(cwd)
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float):
+    """Print the change of every metric against the baseline; returns the regressions."""
+    regressions = []
+    print(f"\n{'metric':45s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, current in metrics.items():
+        base = baseline.get(name)
+        if base is None or current["better"] == "none" or not base["value"]:
+            continue
+        change = current["value"] / base["value"] - 1
+        worse = change > tolerance if current["better"] == "lower" else change < -tolerance
+        if worse:
+            regressions.append(name)
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:45s} {base['value']:12.4f} {current['value']:12.4f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cvs", type=int, default=100, help="synthetic CVs per corpus")
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated LLM latency (s)")
+    parser.add_argument("--only", nargs="*", choices=["loader", "vectorstore", "extractor", "api"])
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--save-baseline", metavar="PATH", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    # Resolve output paths before bench_api changes directory
+    out = os.path.abspath(args.out) if args.out else None
+    baseline_path = os.path.abspath(args.baseline)
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    sections = set(args.only or ["loader", "vectorstore", "extractor", "api"])
+
+    work_dir = tempfile.mkdtemp(prefix="cv-bench-")
+    results = Results()
+    try:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        generate_corpus(os.path.join(corpus_dir, "pdf"), args.cvs, "pdf")
+        generate_corpus(os.path.join(corpus_dir, "html"), args.cvs, "html")
+        docs = None
+        if sections & {"loader", "vectorstore", "extractor"}:
+            docs = bench_loader(results, corpus_dir, args.workers) if "loader" in sections else \
+                load_corpus(corpus_dir, args.workers)
+        if "vectorstore" in sections:
+            bench_vectorstore(results, docs, work_dir, args.queries)
+        if "extractor" in sections:
+            bench_extractor(results, docs, args.llm_latency)
+        if "api" in sections:
+            bench_api(results, work_dir, args.cvs, args.uploads, args.queries, args.llm_latency)
+    finally:
+        if args.keep:
+            print(f"working directory: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "save_baseline")},
+        },
+        "metrics": results.metrics,
+    }
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {save_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results.metrics, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Offline fixtures for the benchmark suite: a synthetic CV corpus (PDF and
+HTML), a deterministic fake chat model standing in for Gemini, and a fake
+embedding model.
+"""
+import asyncio
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+import types
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+FIRST_NAMES = ["Anna", "Minh", "Carlos", "Fatima", "Kenji", "Olga", "Samuel", "Priya", "Lucas", "Amara"]
+LAST_NAMES = ["Nguyen", "Smith", "Garcia", "Khan", "Tanaka", "Ivanova", "Okafor", "Patel", "Martin", "Mensah"]
+SKILLS = ["Python", "FastAPI", "LangChain", "FAISS", "Docker", "Kubernetes", "PyTorch", "SQL", "React",
+          "Go", "Terraform", "Spark", "Airflow", "TypeScript", "AWS", "GCP", "Pandas", "NLP", "MLOps", "Rust"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Labs", "Hooli", "Vandelay Industries", "Stark Systems"]
+TITLES = ["Software Engineer", "Data Scientist", "ML Engineer", "Backend Developer", "DevOps Engineer"]
+SCHOOLS = ["Hanoi University of Science", "MIT", "University of Lagos", "TU Munich", "University of Tokyo"]
+DEGREES = ["BSc Computer Science", "MSc Data Science", "BEng Software Engineering", "PhD Machine Learning"]
+CITIES = ["Hanoi, Vietnam", "Berlin, Germany", "Lagos, Nigeria", "Tokyo, Japan", "Austin, USA"]
+
+
+def make_cv(i: int, rng: random.Random) -> dict:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    start = rng.randint(2005, 2018)
+    jobs = []
+    for _ in range(rng.randint(2, 5)):
+        end = start + rng.randint(1, 4)
+        jobs.append({
+            "company": rng.choice(COMPANIES), "title": rng.choice(TITLES), "years": f"{start} - {end}",
+            "description": " ".join(
+                f"Built {rng.choice(SKILLS)} services handling {rng.randint(1, 900)}k requests per day "
+                f"and mentored {rng.randint(1, 9)} engineers." for _ in range(rng.randint(2, 6))),
+        })
+        start = end
+    return {
+        "full_name": f"{first} {last} {i}",
+        "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+        "phone": f"+1 555 {rng.randint(100, 999)} {rng.randint(1000, 9999)}",
+        "location": rng.choice(CITIES),
+        "skills": rng.sample(SKILLS, rng.randint(4, 10)),
+        "education": [{"school": rng.choice(SCHOOLS), "degree": rng.choice(DEGREES),
+                       "years": f"{start - 14} - {start - 10}"}],
+        "work_experience": jobs,
+    }
+
+
+def cv_lines(cv: dict) -> List[str]:
+    lines = [cv["full_name"], f"Email: {cv['email']}", f"Phone: {cv['phone']}", f"Location: {cv['location']}", "",
+             f"Skills: {', '.join(cv['skills'])}", "", "Work Experience"]
+    for job in cv["work_experience"]:
+        lines.append(f"{job['title']} at {job['company']} ({job['years']})")
+        words = job["description"].split()
+        while words:
+            lines.append(" ".join(words[:14]))
+            words = words[14:]
+        lines.append("")
+    lines.append("Education")
+    lines.extend(f"{e['degree']}, {e['school']} ({e['years']})" for e in cv["education"])
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, lines: List[str], lines_per_page: int = 48):
+    """Minimal text-layer PDF (Helvetica, one text object per page)."""
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in pages:
+        body = "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in page)
+        stream = f"BT /F1 10 Tf 14 TL 50 800 Td\n{body}\nET".encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_html(path: str, cv: dict):
+    body = "\n".join(f"<p>{html.escape(line)}</p>" for line in cv_lines(cv) if line)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head><title>{html.escape(cv['full_name'])}</title></head><body>\n{body}\n</body></html>")
+
+
+def generate_corpus(out_dir: str, n: int, file_type: str = "pdf", seed: int = 0, start: int = 0) -> List[str]:
+    """Write `n` synthetic CVs to `out_dir`; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed + start)
+    paths = []
+    for i in range(start, start + n):
+        cv = make_cv(i, rng)
+        path = os.path.join(out_dir, f"cv_{i:05d}.{file_type}")
+        if file_type == "pdf":
+            write_pdf(path, cv_lines(cv))
+        else:
+            write_html(path, cv)
+        paths.append(path)
+    return paths
+
+
+class FakeCVChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Gemini chat model: answers extraction
+    prompts with a JSON record parsed from the CV text with regexes, and any
+    other prompt with a fixed sentence. `latency` simulates the API round trip
+    (time to the first token when streaming, words follow `token_latency` apart).
+    """
+    latency: float = 0.0
+    token_latency: float = 0.0
+    model: str = "fake-cv-model"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-cv"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        text = messages[-1].content if messages else ""
+        if "CV Text:" not in text:
+            return "This is a deterministic answer from the benchmark model."
+        cv = text.split("CV Text:", 1)[1]
+        lines = [line.strip() for line in cv.splitlines() if line.strip()]
+        email = re.search(r"[\w.+-]+@[\w-]+\.[\w.]+", cv)
+        phone = re.search(r"\+?\d[\d ]{7,}\d", cv)
+        skills = re.search(r"Skills:\s*(.+)", cv)
+        location = re.search(r"Location:\s*(.+)", cv)
+        jobs = re.findall(r"^\s*(.+?) at (.+?) \((\d{4} - \d{4})\)", cv, re.MULTILINE)
+        schools = re.findall(r"^\s*([^,\n]+), (.+?) \((\d{4} - \d{4})\)", cv, re.MULTILINE)
+        return json.dumps({
+            "full_name": lines[0] if lines else "",
+            "email": email.group() if email else "",
+            "phone": phone.group() if phone else "",
+            "location": location.group(1).strip() if location else "",
+            "education": [{"degree": degree, "school": school, "years": years} for degree, school, years in schools],
+            "work_experience": [{"title": title, "company": company, "years": years} for title, company, years in jobs],
+            "skills": [s.strip() for s in skills.group(1).split(",")] if skills else [],
+            "certifications": [],
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for n, token in enumerate(re.findall(r"\S+\s*", self._answer(messages))):
+            if n and self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for n, token in enumerate(re.findall(r"\S+\s*", self._answer(messages))):
+            if n and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def fake_embeddings(size: int = 768):
+    return DeterministicFakeEmbedding(size=size)
+
+
+def install_fake_llm(latency: float = 0.0, token_latency: float = 0.0):
+    """Replace src.base.llm_model (Gemini, needs GOOGLE_API_KEY) before src.app is imported."""
+    module = types.ModuleType("src.base.llm_model")
+    module.get_llm = lambda *args, **kwargs: FakeCVChatModel(latency=latency, token_latency=token_latency,
+                                                             callbacks=kwargs.get("callbacks"))
+    sys.modules["src.base.llm_model"] = module
+    return module
@@ -0,0 +1,45 @@
+# API workers of the multi-worker deployment (see docker-compose.workers.yml):
+#   INDEX_ROLE=reader gunicorn -c docker/gunicorn.conf.py src.app:app
+# Every worker serves the memory-mapped index generation written by src/worker.py.
+# With PROMETHEUS_MULTIPROC_DIR set, /metrics aggregates every worker and parser process.
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", max(1, (os.cpu_count() or 1) // 2)))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # Metric files of a previous run would be counted again
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+    # Load the model weights once, in the master: the forked workers share them
+    # copy-on-write. Only the weights are loaded here; running the models
+    # before the fork would start thread pools that do not survive it.
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+    from src.rag.embeddings import DEFAULT_MODEL, shared_model
+
+    device = os.getenv("EMBEDDING_DEVICE", "cpu")
+    shared_model(SentenceTransformer, DEFAULT_MODEL, device)
+    if os.getenv("RERANKER_MODEL"):
+        shared_model(CrossEncoder, os.environ["RERANKER_MODEL"], "cpu")
+    server.log.info("Models loaded before forking %s worker(s)", server.cfg.workers)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # Split the cores between the workers instead of each using all of them
+    import torch
+
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // server.cfg.workers))
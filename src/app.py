@@ -1,20 +1,85 @@
-from fastapi import FastAPI, UploadFile, File, Form
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from langserve import add_routes
+from sse_starlette.sse import EventSourceResponse
 from typing import List, Any
 from src.base.llm_model import get_llm
-from src.rag.file_loader import Loader, Exporter
+from src.base import metrics
+from src.rag.file_loader import Exporter
 from src.rag.cv_extractor import CVExtractor
-from src.rag.vectorstore import CandidateDB
+from src.rag.extraction_cache import ExtractionCache
+from src.rag.candidate_store import CandidateStore, CandidateFilter
+from src.rag.embeddings import CachedEmbeddings
+from src.rag.index_manager import IndexManager, IndexNotReady
+from src.rag.reranker import CrossEncoderReranker
+from src.rag.worker_pool import WorkerPool
+from src.rag.uploads import store_upload
+from src.rag.jobs import JobStore, JobRunner, DONE, FAILED
 from src.rag.main import build_rag_chain, InputQA, OutputQA
 from src.chat.main import build_chat_chain
 import os
 
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("src").setLevel(logging.INFO)
+
+# Every LLM call (RAG, chat, extraction) is timed and its tokens counted
+llm = get_llm(callbacks=[metrics.LLMMetrics()])
+extractor = CVExtractor(llm, cache=ExtractionCache("./cache/extraction.db"))
+# Extracted fields of every uploaded CV, used to filter searches
+candidates = CandidateStore("./cache/candidates.db")
+
+genai_docs = "./data_source/generative_ai"
+# Parser processes shared by startup ingestion and uploads
+pool = WorkerPool()
+# Searches fuse BM25 and vector rankings; set RERANKER_MODEL (e.g.
+# cross-encoder/ms-marco-MiniLM-L-6-v2) to re-rank the top hits on CPU
+reranker = CrossEncoderReranker(os.environ["RERANKER_MODEL"]) if os.getenv("RERANKER_MODEL") else None
+# INDEX_ROLE=reader: one of several API workers (docker/gunicorn.conf.py) serving
+# the index generations written by the ingestion worker (src/worker.py), which
+# also processes the uploads; the models are then loaded once, before the fork
+read_only = os.getenv("INDEX_ROLE", "writer") == "reader"
+embedding_model = CachedEmbeddings(device=os.getenv("EMBEDDING_DEVICE", "cpu"),
+                                   read_only_cache=True) if read_only else None
+# Loaded/built in the background by the lifespan hook
+index = IndexManager(data_dir=genai_docs, data_type="pdf", workers=pool.processes, pool=pool,
+                     reranker=reranker, read_only=read_only, embedding_model=embedding_model,
+                     on_remove=candidates.delete)
+genai_chain = build_rag_chain(llm, index)
+# Uploads are ingested by background workers from a persistent job queue
+jobs = JobStore("./cache/jobs.db")
+runner = JobRunner(jobs, index, extractor, candidates, upload_dir=genai_docs,
+                   workers=0 if read_only else int(os.getenv("JOB_WORKERS", "2")))
+
+chat_chain = build_chat_chain(llm, 
+                              history_folder="./chat_histories",
+                              max_history_length=6)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not read_only:
+        pool.start()
+    index.start()
+    await runner.start()
+    yield
+    await runner.stop()
+    index.stop(timeout=30)
+    pool.stop()
+
+
 app = FastAPI(
     title="LangChain Server",
     version="1.0",
     description="A simple api server using Langchain's Runnable interfaces",
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -24,57 +89,157 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(metrics.TimingMiddleware)
+metrics.setup_tracing(app)
 
-llm = get_llm()
-extractor = CVExtractor(llm)
-candidate_db = CandidateDB()
-
-genai_docs = "./data_source/generative_ai"
-genai_chain = build_rag_chain(llm, data_dir=genai_docs, data_type="pdf")
+def sse_event(event: str, data) -> dict:
+    return {"event": event, "data": json.dumps(data, ensure_ascii=False)}
 
-chat_chain = build_chat_chain(llm, 
-                              history_folder="./chat_histories",
-                              max_history_length=6)
+@app.exception_handler(IndexNotReady)
+async def index_not_ready_handler(request: Request, exc: IndexNotReady):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "index": exc.status},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-@app.post("/upload_cv")
+@app.post("/upload_cv", status_code=202)
 async def upload_cv(
     file: List[UploadFile] = File(None),
-    drive_link: str = Form(None)
+    drive_link: str = Form(None),
+    stream: bool = False,
+    wait: bool = False,
+    idempotency_key: str = Header(None)
 ):
-    os.makedirs("./data_source/generative_ai", exist_ok=True)
-    sources = []
+    files = []
+    for f in file or []:
+        # Streamed to disk off the event loop, stored under its content hash
+        try:
+            path, digest, _ = await run_in_threadpool(store_upload, f.file, genai_docs, f.filename)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            await f.close()
+        files.append((f.filename, path, digest))
+    if not files and not drive_link:
+        raise HTTPException(status_code=422, detail="Upload a file or give a drive_link")
+
+    # A retried request maps to the job it already created. A Drive folder can
+    # change between imports: without an explicit key, only a job still in
+    # progress is reused for it.
+    key = idempotency_key or hashlib.sha256(
+        json.dumps([sorted(digest for _, _, digest in files), drive_link]).encode()).hexdigest()
+    job_id, created = await run_in_threadpool(jobs.submit, files, drive_link, key,
+                                              idempotency_key is not None or not drive_link)
+    runner.notify()
 
-    if file:
-        for f in file:
-            file_path = f"./data_source/generative_ai/{f.filename}"
-            with open(file_path, "wb") as out_file:
-                content = await f.read()
-                out_file.write(content)
-            sources.append(file_path)
+    if stream:
+        return EventSourceResponse(stream_job(job_id))
+    if wait:
+        job = await runner.wait(job_id)
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=500, detail=job["error"])
+        result = job_result(job)
+        return JSONResponse({"message": "CVs processed", **result}, status_code=200)
+    return {"job_id": job_id, "created": created, "status_url": f"/jobs/{job_id}"}
 
-    if drive_link:
-        sources.append(drive_link)
+def job_result(job: dict) -> dict:
+    """Records of the job's extracted CVs, and the files that were already known."""
+    return {
+        "job_id": job["id"],
+        "extracted": [f["record"] for f in job["files"] if f["status"] == "extracted"],
+        "duplicates": [{"file": f["name"], "source": f["source"], "profile": f["record"]}
+                       for f in job["files"] if f["status"] == "duplicate"],
+        "failed": [{"file": f["name"], "source": f["source"], "status": f["status"], "error": f["error"]}
+                   for f in job["files"] if f["status"] in ("failed", "empty")],
+    }
 
-    # Load all files with multiprocessing-aware loader
-    loader = Loader(file_type="pdf")
-    docs = loader.load(sources, workers=7)
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """State of an ingestion job, with per-file progress."""
+    job = await run_in_threadpool(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
 
-    extracted_data = extractor.extract(docs)
-    candidate_db.add_documents(docs)
+@app.get("/jobs/{job_id}/result")
+async def job_results(job_id: str):
+    job = await run_in_threadpool(jobs.get, job_id, True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if job["status"] not in (DONE, FAILED):
+        return JSONResponse({"job_id": job_id, "status": job["status"], "progress": job["progress"]},
+                            status_code=202, headers={"Retry-After": "2"})
+    return {"status": job["status"], "error": job["error"], **job_result(job)}
 
-    return {"message": "CVs processed", "extracted": extracted_data}
+async def stream_job(job_id: str, interval: float = 0.5):
+    """
+    SSE stream of an ingestion job: `job` with its id, one `duplicate` event per
+    file already indexed, `indexed` once the new files are in the index, then
+    one `candidate` event per CV as soon as its extraction finishes
+    (completion order, `index` gives the file's position) or `failed`, then
+    `end`. The job keeps running if the client disconnects.
+    """
+    yield sse_event("job", {"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+    sent, indexed = {}, False
+    try:
+        while True:
+            job = await run_in_threadpool(jobs.get, job_id, True)
+            if not indexed and job["files"] and all(f["status"] != "queued" for f in job["files"]):
+                indexed = True
+                yield sse_event("indexed", {"chunks": job["chunks"]})
+            for f in job["files"]:
+                if sent.get(f["position"]) == f["status"]:
+                    continue
+                sent[f["position"]] = f["status"]
+                if f["status"] == "duplicate":
+                    yield sse_event("duplicate", {"file": f["name"], "source": f["source"], "profile": f["record"]})
+                elif f["status"] == "extracted":
+                    yield sse_event("candidate", {"index": f["position"], "record": f["record"]})
+                elif f["status"] in ("failed", "empty"):
+                    yield sse_event("failed", {"file": f["name"], "source": f["source"],
+                                               "detail": f["error"] or f["status"]})
+            if job["status"] == FAILED:
+                yield sse_event("error", {"detail": job["error"]})
+            if job["status"] in (DONE, FAILED):
+                break
+            await asyncio.sleep(interval)
+    except Exception as e:
+        yield sse_event("error", {"detail": f"{type(e).__name__}: {e}"})
+    yield sse_event("end", {})
 
 class SearchRequest(BaseModel):
     query: str
-    filter: dict | None = None
+    filter: CandidateFilter | None = None  # skills, certifications, min_years, degree, location
+    k: int = 5  # candidates to return
+    chunks_per_candidate: int = 2
+    nprobe: int | None = None  # IVF lists to scan
+    ef_search: int | None = None  # HNSW candidate list size
 
 @app.post("/search_candidates")
 async def search_candidates(req: SearchRequest):
-    results = candidate_db.search(req.query)
-    matches = [
-        {"text": doc.page_content, "metadata": doc.metadata} for doc in results
+    sources = None
+    if req.filter is not None and not req.filter.is_empty():
+        try:
+            sources = await run_in_threadpool(candidates.filter_sources, req.filter)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    results = await run_in_threadpool(index.search_candidates, req.query, k=req.k, sources=sources,
+                                      chunks_per_candidate=req.chunks_per_candidate,
+                                      nprobe=req.nprobe, ef_search=req.ef_search)
+    profiles = await run_in_threadpool(candidates.get, [source for source, _ in results])
+    found = [
+        {
+            "source": source,
+            "score": chunks[0][1],  # L2 distance of the closest chunk, lower is better
+            "profile": profiles.get(source),
+            "matches": [{"text": doc.page_content, "metadata": doc.metadata, "score": score}
+                        for doc, score in chunks],
+        }
+        for source, chunks in results
     ]
-    return {"matches": matches}
+    # `matches` keeps the flat chunk list of earlier versions
+    return {"candidates": found, "matches": [match for c in found for match in c["matches"]]}
 
 class ExportRequest(BaseModel):
     data: Any
@@ -87,13 +252,34 @@ async def export_candidates(req: ExportRequest):
     return {"message": "Candidates exported", "file_path": file_path}
 
 @app.post("/generative_ai", response_model=OutputQA)
-async def generative_ai(inputs: InputQA):
-    answer = genai_chain.invoke(inputs.question)
+async def generative_ai(inputs: InputQA, stream: bool = False):
+    index.get_db()  # fail fast with 503 while the index is loading
+    if stream:
+        return EventSourceResponse(stream_answer(inputs.question))
+    answer = await genai_chain.ainvoke(inputs.question)
     return {"answer": answer}
 
+async def stream_answer(question: str):
+    """SSE stream of the answer: `data` events with text chunks, then `end`."""
+    try:
+        async for chunk in genai_chain.astream(question):
+            yield sse_event("data", chunk)
+    except Exception as e:
+        yield sse_event("error", {"detail": f"{type(e).__name__}: {e}"})
+    yield sse_event("end", {})
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return extractor.cache.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/check")
 async def check():
-    return {"status": "ok"}
+    return {"status": "ok", **index.health()}
 
 # --------- Langserve Routes - Playground ----------------
 add_routes(app, 
@@ -0,0 +1,247 @@
+"""
+Prometheus metrics and optional OpenTelemetry spans for the hot paths
+(parse, split, embed, FAISS, LLM calls, chat history).
+
+`timed(stage)` feeds the `cv_stage_duration_seconds` histogram and, inside an
+HTTP request, the request's per-stage breakdown (`cv_request_stage_seconds`
+and the `Server-Timing` response header). Spans are only created once
+`setup_tracing` has found an OTLP endpoint.
+
+Parser worker processes have their own registries: PROMETHEUS_MULTIPROC_DIR,
+an empty directory, aggregates them in /metrics (the compose files set it and
+empty it at every start, see docker/gunicorn.conf.py).
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram("cv_stage_duration_seconds", "Time spent in a hot-path stage",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+STAGE_ITEMS = Counter("cv_stage_items_total", "Items (files, chunks, vectors, messages) processed by a stage",
+                      ["stage"])
+STAGE_ERRORS = Counter("cv_stage_errors_total", "Stage calls that raised", ["stage"])
+EMBEDDING_CACHE = Counter("cv_embedding_cache_total", "Chunk embedding cache lookups", ["result"])
+QUERY_CACHE = Counter("cv_query_cache_total", "Query embedding / search result cache lookups",
+                      ["cache", "result"])
+LLM_CALLS = Counter("cv_llm_calls_total", "LLM calls by outcome", ["model", "outcome"])
+LLM_RETRIES = Counter("cv_llm_retries_total", "LLM calls that are retries of a failed attempt", ["model"])
+LLM_TOKENS = Counter("cv_llm_tokens_total", "LLM tokens", ["model", "kind"])
+CHAT_HISTORY_MESSAGES = Histogram("cv_chat_history_messages", "Messages loaded per chat session",
+                                  buckets=(0, 2, 4, 6, 8, 12, 16, 24, 32, 64))
+REQUEST_SECONDS = Histogram("cv_request_duration_seconds", "HTTP request latency",
+                            ["route", "method", "status"], buckets=LATENCY_BUCKETS)
+REQUEST_STAGE_SECONDS = Histogram("cv_request_stage_seconds", "Time per stage within one HTTP request",
+                                  ["route", "stage"], buckets=LATENCY_BUCKETS)
+
+# {stage: seconds} of the request being served, None outside requests
+_request_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+_tracer = None
+
+
+# Labelled histogram children by stage, `labels()` takes a lock on every call
+_stage_histograms = {}
+
+
+def record(stage: str, seconds: float, items: int = None):
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = STAGE_SECONDS.labels(stage)
+    histogram.observe(seconds)
+    if items:
+        STAGE_ITEMS.labels(stage).inc(items)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class _Timer:
+    __slots__ = ("stage", "items", "attributes", "span", "start")
+
+    def __init__(self, stage: str, items: int, attributes: dict) -> None:
+        self.stage = stage
+        self.items = items
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self):
+        if _tracer is not None:
+            self.span = _tracer.start_as_current_span(self.stage, attributes=self.attributes)
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start, self.items)
+        if exc_type is not None:
+            STAGE_ERRORS.labels(self.stage).inc()
+        if self.span is not None:
+            self.span.__exit__(exc_type, exc, tb)
+        return False
+
+
+def timed(stage: str, items: int = None, **attributes) -> _Timer:
+    """Context manager timing the block as `stage`, with a span of the same name when tracing is on."""
+    return _Timer(stage, items, attributes)
+
+
+@contextmanager
+def request_timings(route: str):
+    """Collect the stage timings of one request; yields the {stage: seconds} dict."""
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+        for stage, seconds in timings.items():
+            REQUEST_STAGE_SECONDS.labels(route, stage).observe(seconds)
+
+
+def server_timing(timings: dict, total: float) -> str:
+    """`Server-Timing` header value (milliseconds)."""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def route_of(scope) -> str:
+    """Route template of a request, so metric labels stay bounded."""
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: request latency per route, and the per-stage breakdown
+    of each request (retrieval, embedding, LLM ...) as a histogram and a
+    `Server-Timing` header. Streamed bodies are timed until their last chunk.
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = route_of(scope)
+        start = time.perf_counter()
+        status = 500
+        with request_timings(route) as timings:
+            async def send_with_timings(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(timings, time.perf_counter() - start))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timings)
+            finally:
+                REQUEST_SECONDS.labels(route, scope["method"], status).observe(time.perf_counter() - start)
+
+
+def render():
+    """Exposition of every metric; returns (body, content type)."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def setup_tracing(app=None, service_name: str = "cv-service") -> bool:
+    """
+    Export spans with OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set (and the
+    OpenTelemetry SDK/exporter are installed); FastAPI requests become the
+    parent spans of the stages. Returns whether tracing is on.
+    """
+    global _tracer
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return False
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        print(f"OpenTelemetry tracing disabled: {e}")
+        return False
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("src.base.metrics")
+    if app is not None:
+        try:
+            from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+            FastAPIInstrumentor.instrument_app(app)
+        except ImportError:
+            pass
+    return True
+
+
+class LLMMetrics(BaseCallbackHandler):
+    """
+    LangChain callback handler timing every chat model call as the
+    `llm_call` stage, with outcome, retry and token counters.
+    Attach it to the model (`callbacks=[LLMMetrics()]`).
+    """
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._runs = {}
+
+    def _start(self, run_id: UUID, tags, metadata):
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        if any(tag.startswith("retry:attempt:") for tag in tags or ()):
+            LLM_RETRIES.labels(model).inc()
+        span = _tracer.start_span("llm_call", attributes={"llm.model": model}) if _tracer else None
+        self._runs[run_id] = (time.perf_counter(), model, span)
+
+    def _finish(self, run_id: UUID, outcome: str):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        start, model, span = run
+        record("llm_call", time.perf_counter() - start)
+        LLM_CALLS.labels(model, outcome).inc()
+        if span is not None:
+            span.set_attribute("llm.outcome", outcome)
+            span.end()
+        return model
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(run_id, tags, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, metadata=None, **kwargs):
+        self._start(run_id, tags, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model = self._finish(run_id, "ok")
+        if model is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                if usage.get("input_tokens"):
+                    LLM_TOKENS.labels(model, "input").inc(usage["input_tokens"])
+                if usage.get("output_tokens"):
+                    LLM_TOKENS.labels(model, "output").inc(usage["output_tokens"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, type(error).__name__)
@@ -1,12 +1,20 @@
+import json
+import os
 import re
+import sqlite3
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Callable, Union
+from typing import Callable, List, Sequence, Tuple, Union
 
+from cachetools import LRUCache
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain.memory import FileChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
 
 from fastapi import HTTPException
 
+from src.base.metrics import CHAT_HISTORY_MESSAGES, timed
 
 
 def _is_valid_identifier(value: str) -> bool:
@@ -14,14 +22,264 @@ def _is_valid_identifier(value: str) -> bool:
     return bool(valid_characters.match(value))
 
 
+class SQLiteChatLog:
+    """
+    Messages of every session in one SQLite table (WAL), one row per message
+    keyed by (session, seq): appends are single inserts and the last n
+    messages are an index range scan, however long the session is.
+    The version of a session is its last seq.
+    """
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # Only takes effect on a new database: lets compaction give pages back to the OS
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (session, seq)) WITHOUT ROWID"
+        )
+
+    def version(self, session_id: str) -> int:
+        row = self._conn.execute("SELECT MAX(seq) FROM messages WHERE session = ?", (session_id,)).fetchone()
+        return row[0] or 0
+
+    def append(self, session_id: str, records: Sequence[str]) -> Tuple[int, int]:
+        """Append serialized messages; returns the session version before and after."""
+        # IMMEDIATE: other processes appending to the session wait for the seq numbers
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.version(session_id)
+            now = time.time()
+            self._conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?)",
+                                   [(session_id, before + n, record, now) for n, record in enumerate(records, 1)])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return before, before + len(records)
+
+    def tail(self, session_id: str, n: int) -> Tuple[int, List[str]]:
+        """(version, last `n` serialized messages, oldest first)."""
+        rows = self._conn.execute(
+            "SELECT seq, message FROM messages WHERE session = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, n)).fetchall()
+        return (rows[0][0] if rows else 0), [message for _, message in reversed(rows)]
+
+    def clear(self, session_id: str):
+        self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+
+    def compact(self, keep: int) -> int:
+        """Drop all but the last `keep` messages of each session; returns the rows removed."""
+        removed = self._conn.execute(
+            "DELETE FROM messages WHERE seq <= "
+            "(SELECT MAX(seq) FROM messages AS last WHERE last.session = messages.session) - ?",
+            (keep,)).rowcount
+        self._conn.execute("PRAGMA incremental_vacuum")
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+
+class JsonlChatLog:
+    """
+    One append-only `<session>.jsonl` file per session, one message per line.
+    The last n messages are read backwards from the end of the file, and
+    compaction rewrites a file (atomically) once it holds too many messages.
+    The version of a session is its file's identity and size. Compaction
+    only locks out appends of this process: use SQLiteChatLog with several
+    workers.
+    """
+    BLOCK = 1 << 16
+
+    def __init__(self, base_dir: str) -> None:
+        os.makedirs(base_dir, exist_ok=True)
+        self.base_dir = base_dir
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.base_dir, f"{session_id}.jsonl")
+
+    def version(self, session_id: str):
+        try:
+            stat = os.stat(self._path(session_id))
+        except FileNotFoundError:
+            return 0
+        return stat.st_ino, stat.st_size
+
+    def append(self, session_id: str, records: Sequence[str]):
+        before = self.version(session_id)
+        data = "".join(f"{record}\n" for record in records).encode("utf-8")
+        # One write on an O_APPEND descriptor: concurrent appends do not interleave
+        fd = os.open(self._path(session_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        return before, self.version(session_id)
+
+    def tail(self, session_id: str, n: int):
+        try:
+            f = open(self._path(session_id), "rb")
+        except FileNotFoundError:
+            return 0, []
+        with f:
+            stat = os.fstat(f.fileno())
+            position = stat.st_size
+            data = b""
+            while position > 0 and data.count(b"\n") <= n:
+                step = min(self.BLOCK, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+            lines = data.splitlines()
+        return (stat.st_ino, stat.st_size), [line.decode("utf-8") for line in lines[-n:] if line]
+
+    def clear(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def compact(self, keep: int) -> int:
+        removed = 0
+        for name in os.listdir(self.base_dir):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self.base_dir, name)
+            with open(path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)
+            if len(lines) <= keep:
+                continue
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.writelines(lines[-keep:])
+            os.replace(tmp, path)
+            removed += len(lines) - keep
+        return removed
+
+
+class ChatHistoryStore:
+    """
+    Windowed chat histories over a log backend (SQLiteChatLog or
+    JsonlChatLog): reads return the last `window` messages only, so nothing
+    is trimmed or rewritten on the request path. The windows of the
+    `hot_sessions` most recent sessions are kept in an in-process LRU and
+    extended on append; each read checks the session version, so appends
+    from other processes are seen. A daemon thread compacts the log every
+    `compact_interval` seconds, keeping the last `keep` messages per session.
+    """
+    def __init__(self, log, window: int, hot_sessions: int = 1024,
+                 keep: int = None, compact_interval: float = 3600) -> None:
+        self.log = log
+        self.window = window
+        self.keep = max(keep or window, window)
+        self._hot = LRUCache(maxsize=hot_sessions)  # session -> (version, deque of messages)
+        self._lock = threading.Lock()
+        self._compactor = None
+        if compact_interval:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                               name="chat-history-compactor", daemon=True)
+            self._compactor.start()
+
+    def messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            version = self.log.version(session_id)
+            hot = self._hot.get(session_id)
+            if hot is None or hot[0] != version:
+                version, records = self.log.tail(session_id, self.window)
+                hot = self._hot[session_id] = (version, deque(messages_from_dict([json.loads(r) for r in records]),
+                                                              maxlen=self.window))
+            return list(hot[1])
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]):
+        records = [json.dumps(message_to_dict(message), ensure_ascii=False) for message in messages]
+        with self._lock:
+            before, after = self.log.append(session_id, records)
+            hot = self._hot.get(session_id)
+            if hot is not None and hot[0] == before:
+                hot[1].extend(messages)
+                self._hot[session_id] = (after, hot[1])
+            else:
+                self._hot.pop(session_id, None)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self.log.clear(session_id)
+            self._hot.pop(session_id, None)
+
+    def import_file(self, session_id: str, path: Path):
+        """Move a FileChatMessageHistory JSON file into the log (it is renamed `.imported`)."""
+        messages = messages_from_dict(json.loads(path.read_text(encoding="utf-8") or "[]"))
+        if messages:
+            self.add_messages(session_id, messages[-self.keep:])
+        path.rename(path.with_name(f"{path.name}.imported"))
+
+    def compact(self) -> int:
+        with self._lock:
+            removed = self.log.compact(self.keep)
+            self._hot.clear()
+        return removed
+
+    def _compact_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                with timed("chat_history_compact"):
+                    removed = self.compact()
+                if removed:
+                    print(f"Chat history compaction: {removed} message(s) removed")
+            except Exception as e:
+                print(f"Chat history compaction failed: {type(e).__name__}: {e}")
+
+
+class StoredChatMessageHistory(BaseChatMessageHistory):
+    """The history of one session in a ChatHistoryStore; reads and writes are timed."""
+    def __init__(self, store: ChatHistoryStore, session_id: str) -> None:
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with timed("chat_history_read"):
+            messages = self.store.messages(self.session_id)
+        CHAT_HISTORY_MESSAGES.observe(len(messages))
+        return messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with timed("chat_history_write"):
+            self.store.add_messages(self.session_id, list(messages))
+
+    def clear(self) -> None:
+        with timed("chat_history_write"):
+            self.store.clear(self.session_id)
+
+
+def create_history_store(base_dir: Union[str, Path], max_history_length: int,
+                         backend: str = "sqlite", **store_kwargs) -> ChatHistoryStore:
+    """ChatHistoryStore in `base_dir`, with the "sqlite" (history.db) or "jsonl" backend."""
+    if backend == "sqlite":
+        log = SQLiteChatLog(os.path.join(base_dir, "history.db"))
+    elif backend == "jsonl":
+        log = JsonlChatLog(str(base_dir))
+    else:
+        raise ValueError(f"Unknown chat history backend: {backend}")
+    return ChatHistoryStore(log, window=max_history_length, **store_kwargs)
+
+
 def create_session_factory(base_dir: Union[str, Path],
-                           max_history_length: int 
+                           max_history_length: int,
+                           backend: str = "sqlite",
+                           store: ChatHistoryStore = None
                            ) -> Callable[[str], BaseChatMessageHistory]:
     base_dir_ = Path(base_dir) if isinstance(base_dir, str) else base_dir
     if not base_dir_.exists():
         base_dir_.mkdir(parents=True)
+    store = store or create_history_store(base_dir_, max_history_length, backend)
 
-    def get_chat_history(session_id: str) -> FileChatMessageHistory:
+    def get_chat_history(session_id: str) -> StoredChatMessageHistory:
         if not _is_valid_identifier(session_id):
             raise HTTPException(
                 status_code=400,
@@ -29,18 +287,10 @@ def create_session_factory(base_dir: Union[str, Path],
                 "Session ID must only contain alphanumeric characters, "
                 "hyphens, and underscores.",
             )
-        file_path = base_dir_ / f"{session_id}.json"
-
-        chat_hist = FileChatMessageHistory(str(file_path))
-        messages = chat_hist.messages
-
-        if len(messages) > max_history_length:
-            chat_hist.clear()
-            for message in messages[-max_history_length:]:
-                chat_hist.add_message(message)
-
-        print("chat_hist len: ", len(chat_hist.messages))
-        return chat_hist
+        # Sessions written by the former FileChatMessageHistory backend
+        legacy_path = base_dir_ / f"{session_id}.json"
+        if legacy_path.exists():
+            store.import_file(session_id, legacy_path)
+        return StoredChatMessageHistory(store, session_id)
 
     return get_chat_history
-
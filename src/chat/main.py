@@ -21,12 +21,13 @@ class InputChat(BaseModel):
     )
 
 
-def build_chat_chain(llm, history_folder, max_history_length):
+def build_chat_chain(llm, history_folder, max_history_length, history_backend="sqlite"):
     chain = chat_prompt | llm | Str_OutputParser()
     chain_with_history = RunnableWithMessageHistory(
         chain,
         create_session_factory(base_dir=history_folder, 
-                               max_history_length=max_history_length),
+                               max_history_length=max_history_length,
+                               backend=history_backend),
         input_messages_key="human_input",
         history_messages_key="chat_history",
     )
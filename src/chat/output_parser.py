@@ -41,6 +41,10 @@ def json_clean(raw_blocks):
     cleaned_results = []
     
     for block in raw_blocks:
+        if isinstance(block, dict):
+            # Already parsed (per-CV records from CVExtractor)
+            cleaned_results.append(block)
+            continue
         json_str = re.sub(r"^```json\s*|\s*```$", "", block.strip(), flags=re.MULTILINE)
         
         try:
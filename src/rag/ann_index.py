@@ -0,0 +1,146 @@
+import math
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS wants ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    """
+    FAISS index settings for CandidateDB.
+    - flat: exact brute-force search (IndexFlatL2), the default.
+    - ivf_flat / ivf_pq: inverted lists over `nlist` k-means centroids (auto-sized
+      to ~4*sqrt(n) when None), storing full vectors or PQ codes of `pq_m`
+      sub-quantizers x `pq_nbits` bits. Queries scan `nprobe` lists.
+    - hnsw: graph index with `hnsw_m` links per node, `ef_search` candidates per query.
+    IVF indexes are re-trained when the corpus outgrows its centroids by
+    `retrain_factor` (ideal nlist > retrain_factor * current nlist).
+    """
+    index_type: str = "flat"
+    nlist: Optional[int] = None
+    pq_m: int = 16
+    pq_nbits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    nprobe: int = 16
+    ef_search: int = 64
+    retrain_factor: float = 2.0
+
+    def __post_init__(self):
+        assert self.index_type in INDEX_TYPES, f"index_type must be one of {INDEX_TYPES}"
+
+    def build_params(self) -> dict:
+        """Settings that change the stored index (query-time knobs excluded)."""
+        params = asdict(self)
+        params.pop("nprobe")
+        params.pop("ef_search")
+        return params
+
+
+def ideal_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def resolve_index_type(config: IndexConfig, n: int):
+    """Index type and nlist to build for `n` vectors."""
+    nlist = config.nlist or ideal_nlist(n)
+    if config.index_type.startswith("ivf") and (nlist < 2 or n < nlist * MIN_POINTS_PER_CENTROID // 4):
+        # Too few vectors to train centroids: exact search is as fast anyway
+        return "flat", nlist
+    if config.index_type == "ivf_pq" and n < (1 << config.pq_nbits) * MIN_POINTS_PER_CENTROID // 4:
+        # Nor to train the PQ codebooks
+        return "ivf_flat", nlist
+    return config.index_type, nlist
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def create_index(config: IndexConfig, vectors: np.ndarray):
+    """Create (and train, for IVF) an empty index suited to `vectors`."""
+    n, dim = vectors.shape
+    index_type, nlist = resolve_index_type(config, n)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            assert dim % config.pq_m == 0, f"pq_m ({config.pq_m}) must divide the embedding size ({dim})"
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m, config.pq_nbits)
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    apply_search_defaults(index, config)
+    return index
+
+
+def apply_search_defaults(index, config: IndexConfig):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.ef_search
+
+
+def search_params(index, nprobe: int = None, ef_search: int = None, sel=None):
+    """
+    Per-query search parameters, safe to use on an index shared by threads.
+    `sel` (a faiss.IDSelector) restricts the search to some vectors. None
+    when the index defaults apply.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe is not None or sel is not None):
+        # Unset knobs would fall back to the faiss defaults, not the index's
+        return faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe, sel=sel)
+    if isinstance(index, faiss.IndexHNSW) and (ef_search is not None or sel is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or index.hnsw.efSearch, sel=sel)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+def supports_remove(index) -> bool:
+    """
+    Whether removing vectors keeps positions contiguous, as the docstore id map
+    assumes: a flat index compacts, IVF keeps the old ids and HNSW cannot remove.
+    """
+    return isinstance(index, faiss.IndexFlat)
+
+
+def needs_retrain(index, config: IndexConfig) -> bool:
+    """
+    True when the corpus outgrew the index: an IVF index holds far more vectors
+    than its centroids were sized for, or a fallback chosen for a small corpus
+    (flat instead of IVF, IVF-Flat instead of IVF-PQ) can now be upgraded.
+    """
+    if index_type_of(index) != resolve_index_type(config, index.ntotal)[0]:
+        return True
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and config.nlist is None:
+        # A fixed nlist is never re-sized
+        return ideal_nlist(ivf.ntotal) > config.retrain_factor * ivf.nlist
+    return False
+
+
+def memory_per_vector(index) -> float:
+    if index.ntotal == 0:
+        return 0.0
+    return len(faiss.serialize_index(index)) / index.ntotal
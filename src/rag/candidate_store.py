@@ -0,0 +1,207 @@
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.rag.manifest import source_key
+
+# Highest degree wins; Vietnamese titles are matched too (text is NFKC, not ASCII-folded)
+DEGREE_LEVELS = [
+    (4, re.compile(r"\b(ph\.?\s?d|doctor(ate)?|d\.?phil)\b|tiến sĩ", re.IGNORECASE)),
+    (3, re.compile(r"\b(master'?s?|m\.?\s?sc|m\.?\s?eng|mba|m\.?s)\b|thạc sĩ", re.IGNORECASE)),
+    (2, re.compile(r"\b(bachelor'?s?|b\.?\s?sc|b\.?\s?eng|b\.?a|b\.?s|engineer)\b|cử nhân|kỹ sư", re.IGNORECASE)),
+    (1, re.compile(r"\b(associate|diploma)\b", re.IGNORECASE)),
+]
+YEAR = re.compile(r"\b(19[5-9]\d|20\d\d)\b")
+PRESENT = re.compile(r"\b(present|now|current|today|ongoing)\b|hiện tại", re.IGNORECASE)
+
+
+def degree_level(text: str) -> int:
+    """0 (none/unknown), 1 associate, 2 bachelor, 3 master, 4 doctorate."""
+    for level, pattern in DEGREE_LEVELS:
+        if pattern.search(text or ""):
+            return level
+    return 0
+
+
+def years_of_experience(work_experience: list, this_year: int = None) -> Optional[float]:
+    """
+    Total years covered by the work history ("2016 - 2019", "2020 - Present"),
+    overlapping jobs counted once. None when no period can be read.
+    """
+    this_year = this_year or datetime.date.today().year
+    periods = []
+    for job in work_experience or []:
+        text = " ".join(str(job.get(key, "")) for key in ("years", "duration", "dates")) \
+            if isinstance(job, dict) else str(job)
+        years = [int(year) for year in YEAR.findall(text)]
+        if not years:
+            continue
+        end = this_year if PRESENT.search(text) else max(years)
+        periods.append((min(years), max(end, min(years))))
+    if not periods:
+        return None
+    total, current_start, current_end = 0, None, None
+    for start, end in sorted(periods):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    total += current_end - current_start
+    return float(total)
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(str(term).lower().split())
+
+
+def _names(values) -> List[str]:
+    """Skill/certification names from a list of strings or objects."""
+    names = []
+    for value in values if isinstance(values, list) else [values]:
+        if isinstance(value, dict):
+            value = value.get("name") or value.get("title") or next(iter(value.values()), "")
+        if value:
+            names.append(normalize_term(value))
+    return names
+
+
+@dataclass(frozen=True)
+class CandidateFilter:
+    """
+    Structured search filter, every given criterion must hold:
+    - skills / certifications: all listed (case-insensitive exact names)
+    - min_years: at least this many years of work experience
+    - degree: at least this degree ("bachelor", "msc", "phd", ...)
+    - location: substring of the candidate's location
+    """
+    skills: Optional[List[str]] = None
+    certifications: Optional[List[str]] = None
+    min_years: Optional[float] = None
+    degree: Optional[str] = None
+    location: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.skills or self.certifications or self.min_years is not None
+                    or self.degree or self.location)
+
+
+class CandidateStore:
+    """
+    SQLite table of the fields extracted from each CV, keyed by source file
+    (the same key as the ingestion manifest, which maps it to the chunk ids).
+    Skills and certifications are kept one row per term in an indexed table,
+    so a filter resolves to candidate sources without touching the vectors.
+    """
+    def __init__(self, path: str = "./cache/candidates.db") -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS candidates ("
+            " source TEXT PRIMARY KEY, full_name TEXT, email TEXT, location TEXT,"
+            " years_experience REAL, degree_level INTEGER NOT NULL DEFAULT 0,"
+            " record TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS candidates_years ON candidates(years_experience)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS candidates_degree ON candidates(degree_level)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS candidate_terms ("
+            " kind TEXT NOT NULL, term TEXT NOT NULL, source TEXT NOT NULL,"
+            " PRIMARY KEY (kind, term, source)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS candidate_terms_source ON candidate_terms(source)")
+
+    def upsert(self, records: Iterable[dict]):
+        """Store extracted records (CVExtractor output); records without a source are skipped."""
+        rows, terms, sources = [], [], []
+        for record in records:
+            if not record.get("source"):
+                continue
+            source = source_key(record["source"])
+            degrees = " ".join(f"{e.get('degree', '')} {e.get('school', '')}" if isinstance(e, dict) else str(e)
+                               for e in record.get("education") or [])
+            location = record.get("location") or record.get("address") or ""
+            rows.append((source, record.get("full_name"), record.get("email"),
+                         normalize_term(location) if isinstance(location, str) else "",
+                         years_of_experience(record.get("work_experience")), degree_level(degrees),
+                         json.dumps(record, ensure_ascii=False), time.time()))
+            terms.extend(("skill", term, source) for term in set(_names(record.get("skills") or [])))
+            terms.extend(("certification", term, source)
+                         for term in set(_names(record.get("certifications") or [])))
+            sources.append((source,))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO candidates VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.executemany("DELETE FROM candidate_terms WHERE source = ?", sources)
+                self._conn.executemany("INSERT OR IGNORE INTO candidate_terms VALUES (?, ?, ?)", terms)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, sources: Iterable[str]):
+        keys = [(source_key(source),) for source in sources]
+        with self._lock:
+            self._conn.executemany("DELETE FROM candidates WHERE source = ?", keys)
+            self._conn.executemany("DELETE FROM candidate_terms WHERE source = ?", keys)
+
+    def filter_sources(self, criteria: CandidateFilter) -> Set[str]:
+        """Sources of the candidates matching every criterion."""
+        clauses, args = [], []
+        if criteria.min_years is not None:
+            clauses.append("years_experience >= ?")
+            args.append(criteria.min_years)
+        if criteria.degree:
+            level = degree_level(criteria.degree)
+            if not level:
+                raise ValueError(f"Unknown degree: {criteria.degree}")
+            clauses.append("degree_level >= ?")
+            args.append(level)
+        if criteria.location:
+            # A literal substring: % and _ in the input are not wildcards
+            location = normalize_term(criteria.location)
+            for char in ("\\", "%", "_"):
+                location = location.replace(char, f"\\{char}")
+            clauses.append("location LIKE ? ESCAPE '\\'")
+            args.append(f"%{location}%")
+        for kind, values in (("skill", criteria.skills), ("certification", criteria.certifications)):
+            names = sorted(set(_names(values or [])))
+            if names:
+                clauses.append(
+                    "source IN (SELECT source FROM candidate_terms WHERE kind = ? AND term IN "
+                    f"({', '.join('?' * len(names))}) GROUP BY source HAVING COUNT(*) = ?)")
+                args.extend([kind, *names, len(names)])
+        query = "SELECT source FROM candidates"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(query, args)}
+
+    def get(self, sources: Iterable[str]) -> Dict[str, dict]:
+        """{source: extracted record} of the known candidates among `sources`."""
+        keys = list(dict.fromkeys(source_key(source) for source in sources))
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT source, record FROM candidates WHERE source IN ({', '.join('?' * len(keys))})",
+                keys).fetchall()
+        return {source: json.loads(record) for source, record in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
@@ -0,0 +1,185 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Union
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_FILE = "index.faiss"
+BLOB_FILE = "chunks.bin"
+TABLE_FILE = "chunks.npy"      # per FAISS position: text offset, text length, metadata offset, metadata length
+IDS_FILE = "ids.npy"           # docstore id per FAISS position
+LOOKUP_FILE = "ids_sorted.npy"  # ids sorted, with their position, for binary search
+LEGACY_FILE = "index.pkl"      # docstore pickled by FAISS.save_local
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Docstore of CV chunks read from a saved generation: chunk text and metadata
+    sit in a memory-mapped blob found through an offset table, so only the
+    chunks returned by a search are decoded.
+
+    Chunks added since the generation was loaded stay in memory and deletes
+    are recorded as tombstones; `write` stores a compacted copy. A `copy`
+    shares the mapped files and only duplicates these in-memory changes.
+    """
+    def __init__(self, path: str = None) -> None:
+        self._added: Dict[str, Document] = {}
+        self._deleted = set()
+        self._blob = None
+        self._table = np.empty((0, 4), dtype=np.int64)
+        self._ids = np.empty(0, dtype="S1")
+        self._sorted_ids = self._ids
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        if path is not None:
+            self._open(path)
+
+    def _open(self, path: str):
+        self._table = np.load(os.path.join(path, TABLE_FILE), mmap_mode="r")
+        if len(self._table) == 0:
+            return
+        self._ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")
+        lookup = np.load(os.path.join(path, LOOKUP_FILE), mmap_mode="r")
+        self._sorted_ids, self._sorted_rows = lookup["id"], lookup["row"]
+        with open(os.path.join(path, BLOB_FILE), "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def index_to_docstore_id(self) -> Dict[int, str]:
+        """FAISS position -> docstore id mapping of the loaded generation."""
+        return {i: id_.decode() for i, id_ in enumerate(self._ids)}
+
+    def copy(self) -> "ChunkStore":
+        store = ChunkStore()
+        store.__dict__.update(self.__dict__)
+        store._added = dict(self._added)
+        store._deleted = set(self._deleted)
+        return store
+
+    def _row(self, id_: str):
+        key = id_.encode()
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._sorted_rows[i])
+        return None
+
+    def _read(self, offset: int, length: int) -> bytes:
+        return self._blob[offset:offset + length] if length else b""
+
+    def _contains(self, id_: str) -> bool:
+        if id_ in self._added:
+            return True
+        return id_ not in self._deleted and self._row(id_) is not None
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self._added.get(search)
+        if doc is not None:
+            return doc
+        row = None if search in self._deleted else self._row(search)
+        if row is None:
+            return f"ID {search} not found."
+        text_offset, text_len, meta_offset, meta_len = (int(v) for v in self._table[row])
+        return Document(
+            id=search,
+            page_content=self._read(text_offset, text_len).decode("utf-8"),
+            metadata=json.loads(self._read(meta_offset, meta_len)),
+        )
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = [id_ for id_ in texts if self._contains(id_)]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: List) -> None:
+        missing = [id_ for id_ in ids if not self._contains(id_)]
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for id_ in ids:
+            if self._added.pop(id_, None) is None:
+                self._deleted.add(id_)
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._added)
+
+    @staticmethod
+    def write(path: str, docstore: Docstore, ids: List[str]):
+        """Write the documents `ids` of `docstore`, in FAISS position order, to `path`."""
+        table = np.zeros((len(ids), 4), dtype=np.int64)
+        offset = 0
+        with open(os.path.join(path, BLOB_FILE), "wb") as f:
+            for row, id_ in enumerate(ids):
+                doc = docstore.search(id_)
+                text = doc.page_content.encode("utf-8")
+                meta = json.dumps(doc.metadata, ensure_ascii=False, default=str).encode("utf-8")
+                f.write(text)
+                f.write(meta)
+                table[row] = (offset, len(text), offset + len(text), len(meta))
+                offset += len(text) + len(meta)
+        encoded = np.array([id_.encode() for id_ in ids] or [b""])[:len(ids)]
+        order = np.argsort(encoded, kind="stable")
+        lookup = np.empty(len(ids), dtype=[("id", encoded.dtype), ("row", np.int64)])
+        lookup["id"], lookup["row"] = encoded[order], order
+        np.save(os.path.join(path, TABLE_FILE), table)
+        np.save(os.path.join(path, IDS_FILE), encoded)
+        np.save(os.path.join(path, LOOKUP_FILE), lookup)
+
+
+def save_store(db: FAISS, path: str):
+    """Save a FAISS store as index + chunk store (no pickle)."""
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(db.index, os.path.join(path, INDEX_FILE))
+    ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+    ChunkStore.write(path, db.docstore, ids)
+
+
+def _convert_legacy(db: FAISS, path: str):
+    """
+    Write the chunk store of `db`, loaded from the `FAISS.save_local` store in
+    `path`, next to its index, then set index.pkl aside as index.pkl.bak.
+    The table is moved in last: its presence marks the store as converted.
+    """
+    tmp_dir = tempfile.mkdtemp(dir=path, prefix=".convert-")
+    try:
+        ChunkStore.write(tmp_dir, db.docstore, [db.index_to_docstore_id[i] for i in range(db.index.ntotal)])
+        for name in (BLOB_FILE, IDS_FILE, LOOKUP_FILE, TABLE_FILE):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(path, name))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        os.replace(os.path.join(path, LEGACY_FILE), os.path.join(path, f"{LEGACY_FILE}.bak"))
+    except FileNotFoundError:
+        pass  # converted by another process meanwhile
+
+
+def load_store(path: str, embedding, mmap_index: bool = False) -> FAISS:
+    """
+    Load a store saved by `save_store`. A store saved by `FAISS.save_local`
+    (index.pkl) is unpickled once and converted in place to a chunk store
+    (see `_convert_legacy`); if `path` is not writable, it is served from
+    memory instead. With `mmap_index`, the FAISS vectors are memory-mapped
+    read-only too, so processes serving the same generation share them
+    through the page cache; such an index cannot be modified.
+    """
+    if not os.path.exists(os.path.join(path, TABLE_FILE)):
+        legacy = FAISS.load_local(path, embedding, allow_dangerous_deserialization=True)
+        store = ChunkStore()
+        store.add(legacy.docstore._dict if isinstance(legacy.docstore, InMemoryDocstore) else
+                  {id_: legacy.docstore.search(id_) for id_ in legacy.index_to_docstore_id.values()})
+        db = FAISS(embedding, legacy.index, store, legacy.index_to_docstore_id)
+        try:
+            _convert_legacy(db, path)
+        except OSError as e:
+            print(f"Could not convert the store in {path}: {type(e).__name__}: {e}")
+            return db
+    store = ChunkStore(path)
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap_index else 0
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+    return FAISS(embedding, index, store, store.index_to_docstore_id())
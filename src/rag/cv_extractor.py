@@ -1,14 +1,55 @@
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
+from collections import defaultdict
+from typing import AsyncIterator, List, Literal, Tuple
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableLambda
 from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.rag.utils import parse_json, merge_records
+from src.rag.extraction_cache import ExtractionCache, cache_key
+from src.base.metrics import timed
+
+# Gemini quota errors (HTTP 429 / RESOURCE_EXHAUSTED)
+RATE_LIMIT_ERRORS = (ResourceExhausted, TooManyRequests)
+
+# Rough chars-per-token ratio used to budget prompts without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def group_by_source(docs: list[Document]) -> Tuple[List[str], List[str]]:
+    """
+    Reassemble split pages/chunks into one text per source file, keeping
+    the page order and the chunk order within each page.
+    """
+    grouped = defaultdict(list)
+    for seq, doc in enumerate(docs):
+        source = doc.metadata.get("source", "")
+        grouped[source].append((doc.metadata.get("page", 0), seq, doc.page_content))
+    sources = list(grouped)
+    texts = ["\n".join(text for _, _, text in sorted(grouped[source])) for source in sources]
+    return sources, texts
+
 
 class CVExtractor:
-    def __init__(self, llm):
+    def __init__(self, llm,
+                 max_concurrency: int = 8,
+                 requests_per_minute: int = 60,
+                 max_retries: int = 5,
+                 max_input_tokens: int = 8000,
+                 section_tokens: int = 4000,
+                 cache: ExtractionCache = None):
         self.prompt = PromptTemplate.from_template("""
         Given the following CV text, extract the following information in JSON format:
         - Full Name
         - Email
         - Phone Number
+        - Location (city, country)
         - Education (school, degree, years)
         - Work Experience (company, title, years, description)
         - Skills
@@ -17,13 +58,171 @@ class CVExtractor:
         CV Text:
         {cv_chunk}
 
-        Return the result as JSON:
+        Return the result as a single JSON object with the keys full_name, email,
+        phone, location, education, work_experience, skills, certifications:
         """)
-        self.chain = LLMChain(llm=llm, prompt=self.prompt)
-
-    def extract(self, docs: list[Document]):
-        extracted = []
-        for doc in docs:
-            result = self.chain.run({"cv_chunk": doc.page_content})
-            extracted.append(result)
-        return extracted
+        self.cache = cache
+        self.model_name = getattr(llm, "model", None) or getattr(llm, "model_name", type(llm).__name__)
+        self.max_concurrency = max_concurrency
+        self.max_input_tokens = max_input_tokens
+        # CVs over the budget are extracted per section and merged (map-reduce)
+        self.section_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=section_tokens * CHARS_PER_TOKEN,
+            chunk_overlap=min(200, section_tokens * CHARS_PER_TOKEN // 10),
+        )
+        # Token bucket shared by every call of this extractor, sized to the
+        # Gemini quota; bursts of up to `max_concurrency` requests are allowed.
+        self.rate_limiter = InMemoryRateLimiter(
+            requests_per_second=requests_per_minute / 60,
+            check_every_n_seconds=0.05,
+            max_bucket_size=max_concurrency,
+        )
+        throttle = RunnableLambda(self._throttle, afunc=self._athrottle)
+        # Each retry goes through the bucket again, with jittered exponential backoff
+        llm_call = (throttle | llm).with_retry(
+            retry_if_exception_type=RATE_LIMIT_ERRORS,
+            wait_exponential_jitter=True,
+            exponential_jitter_params={"initial": 1, "max": 30},
+            stop_after_attempt=max_retries,
+        )
+        self.chain = self.prompt | llm_call | StrOutputParser()
+
+    def _throttle(self, prompt):
+        with timed("llm_throttle"):
+            self.rate_limiter.acquire()
+        return prompt
+
+    async def _athrottle(self, prompt):
+        with timed("llm_throttle"):
+            await self.rate_limiter.aacquire()
+        return prompt
+
+    def _plan(self, docs: list[Document], mode: str):
+        """
+        Turn loaded docs into LLM calls. Returns the source of each candidate
+        and the (candidate index, text) sections to extract.
+        """
+        if mode == "chunk":
+            sources = [doc.metadata.get("source", "") for doc in docs]
+            return sources, [(i, doc.page_content) for i, doc in enumerate(docs)]
+        sources, texts = group_by_source(docs)
+        sections = []
+        for i, text in enumerate(texts):
+            if estimate_tokens(text) <= self.max_input_tokens:
+                sections.append((i, text))
+            else:
+                sections.extend((i, part) for part in self.section_splitter.split_text(text))
+        return sources, sections
+
+    def _record(self, source: str, outputs: list) -> dict:
+        """Merge the outputs of every section of a candidate into one record."""
+        errors = [out["error"] for out in outputs if isinstance(out, dict)]
+        answers = [out for out in outputs if isinstance(out, str)]
+        parsed = [parse_json(out) for out in answers]
+        parsed = [p for p in parsed if isinstance(p, dict)]
+        if parsed:
+            record = merge_records(parsed)
+        elif answers:
+            record = {"raw": "\n".join(answers)}
+        else:
+            record = {}
+        if errors:
+            record["errors"] = errors
+        record["source"] = source
+        return record
+
+    def _inputs(self, sections):
+        return [{"cv_chunk": text} for _, text in sections]
+
+    def _lookup(self, sections):
+        """
+        Serve sections from the extraction cache.
+        Returns ({section index: cached answer}, [cache keys], [missed section indexes]).
+        """
+        if self.cache is None:
+            return {}, [None] * len(sections), list(range(len(sections)))
+        keys = [cache_key(text, self.prompt.template, self.model_name) for _, text in sections]
+        cached, misses = {}, []
+        for j, key in enumerate(keys):
+            answer = self.cache.get(key)
+            if answer is None:
+                misses.append(j)
+            else:
+                cached[j] = answer
+        return cached, keys, misses
+
+    def _settle(self, result, key):
+        if isinstance(result, Exception):
+            return {"error": f"{type(result).__name__}: {result}"}
+        if self.cache is not None:
+            self.cache.put(key, result)
+        return result
+
+    def extract(self, docs: list[Document],
+                mode: Literal["document", "chunk"] = "document"):
+        """
+        Extract one record per CV (`document` mode, pages grouped by source) or
+        one record per chunk (`chunk` mode, the legacy behaviour).
+        """
+        sources, sections = self._plan(docs, mode)
+        if not sections:
+            return []
+        results, keys, misses = self._lookup(sections)
+        if misses:
+            answers = self.chain.batch(self._inputs([sections[j] for j in misses]),
+                                       config={"max_concurrency": self.max_concurrency},
+                                       return_exceptions=True)
+            for j, answer in zip(misses, answers):
+                results[j] = self._settle(answer, keys[j])
+        outputs = defaultdict(list)
+        for j, (i, _) in enumerate(sections):
+            outputs[i].append(results[j])
+        return [self._record(source, outputs[i]) for i, source in enumerate(sources)]
+
+    async def astream_extract(self, docs: list[Document],
+                              mode: Literal["document", "chunk"] = "document"
+                              ) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Extract `docs` concurrently (at most `max_concurrency` calls in flight)
+        and yield (candidate index, record) pairs in completion order. A failed
+        call is reported in the record's "errors" instead of aborting the batch.
+        """
+        sources, sections = self._plan(docs, mode)
+        if not sections:
+            return
+        remaining = defaultdict(int)
+        for i, _ in sections:
+            remaining[i] += 1
+        outputs = defaultdict(dict)
+
+        def collect(j, result):
+            i = sections[j][0]
+            outputs[i][j] = result
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                done = outputs.pop(i)
+                return i, self._record(sources[i], [done[k] for k in sorted(done)])
+            return None
+
+        cached, keys, misses = self._lookup(sections)
+        for j, answer in cached.items():
+            finished = collect(j, answer)
+            if finished:
+                yield finished
+        if not misses:
+            return
+        async for n, answer in self.chain.abatch_as_completed(
+                self._inputs([sections[j] for j in misses]),
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True):
+            j = misses[n]
+            finished = collect(j, self._settle(answer, keys[j]))
+            if finished:
+                yield finished
+
+    async def aextract(self, docs: list[Document],
+                       mode: Literal["document", "chunk"] = "document"):
+        extracted = {}
+        async for i, record in self.astream_extract(docs, mode):
+            extracted[i] = record
+        return [extracted[i] for i in sorted(extracted)]
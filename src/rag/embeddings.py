@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List
+
+import numpy as np
+from cachetools import TTLCache
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+
+from src.base.metrics import EMBEDDING_CACHE, QUERY_CACHE
+
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def shared_model(factory, model_name: str, device: str = None):
+    """
+    `factory(model_name, device=device)` (SentenceTransformer, CrossEncoder),
+    loaded once per process. Loaded before a server forks its workers (see
+    docker/gunicorn.conf.py), the weights are inherited by every worker
+    instead of being loaded by each.
+    """
+    key = (factory.__name__, model_name, device)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = factory(model_name, device=device)
+        return _models[key]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Cache key of a query: surrounding and repeated whitespace does not change the results."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Append-only chunk-hash -> float32 vector store.
+    Vectors are appended to `vectors.f32` (one row per entry, row order given by
+    `keys.txt`) and read back through a read-only memory map.
+    Only one process may write the cache; others open it `read_only`, which
+    never modifies the files (they may be in the middle of an append).
+    """
+    def __init__(self, cache_dir: str, read_only: bool = False) -> None:
+        os.makedirs(cache_dir, exist_ok=True)
+        self.read_only = read_only
+        self.keys_path = os.path.join(cache_dir, "keys.txt")
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.dim = None
+        self.rows = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.keys_path)
+                and os.path.exists(self.vectors_path)):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            keys = f.read().split()
+        # Vectors are written before keys; a torn write leaves extra vector bytes only
+        n_vectors = min(len(keys), os.path.getsize(self.vectors_path) // (4 * self.dim))
+        if not self.read_only:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(n_vectors * 4 * self.dim)
+        self.rows = {key: row for row, key in enumerate(keys[:n_vectors])}
+
+    def _vectors(self):
+        n = len(self.rows)
+        if n == 0:
+            return None
+        if self._mmap is None or self._mmap.shape[0] < n:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]):
+        """Return the cached vector of each key, or None when missing."""
+        with self._lock:
+            vectors = self._vectors()
+            rows = [self.rows.get(key) for key in keys]
+        return [None if row is None else vectors[row] for row in rows]
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        if self.read_only:
+            return
+        with self._lock:
+            new = [(key, vec) for key, vec in zip(keys, vectors) if key not in self.rows]
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            block = np.ascontiguousarray(np.stack([vec for _, vec in new]), dtype=np.float32)
+            with open(self.vectors_path, "ab") as f:
+                f.write(block.tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key, _ in new))
+            start = len(self.rows)
+            for offset, (key, _) in enumerate(new):
+                self.rows[key] = start + offset
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Sentence-transformers embeddings with batched, normalized encoding and a
+    persistent chunk-hash cache: chunks seen before (shared boilerplate,
+    re-uploads) never reach the model. Query embeddings are kept in an
+    in-memory LRU with a TTL, as recruiters repeat the same searches.
+    With `read_only_cache`, the chunk cache is read but never written (a
+    process that only serves queries next to the index writer).
+    """
+    def __init__(self,
+                 model_name: str = DEFAULT_MODEL,
+                 cache_dir: str = "./cache/embeddings",
+                 batch_size: int = 64,
+                 normalize: bool = True,
+                 device: str = None,
+                 query_cache_size: int = 4096,
+                 query_cache_ttl: float = 3600,
+                 read_only_cache: bool = False) -> None:
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self._queries = TTLCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self._queries_lock = threading.Lock()
+        self.model = shared_model(SentenceTransformer, model_name, device)
+        slug = re.sub(r"[^a-zA-Z0-9_.-]+", "_", model_name)
+        self.cache = EmbeddingCache(os.path.join(cache_dir, f"{slug}{'-norm' if normalize else ''}"),
+                                    read_only=read_only_cache)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        # Encode each distinct missing chunk once
+        missing = {}
+        for key, text, vec in zip(keys, texts, vectors):
+            if vec is None and key not in missing:
+                missing[key] = text
+        EMBEDDING_CACHE.labels("miss").inc(len(missing))
+        EMBEDDING_CACHE.labels("hit").inc(len(keys) - len(missing))
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            self.cache.put_many(list(missing), encoded)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[key] if vec is None else vec for key, vec in zip(keys, vectors)]
+        return [np.asarray(vec).tolist() for vec in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        text = normalize_query(text)
+        with self._queries_lock:
+            vector = self._queries.get(text)
+        if vector is not None:
+            QUERY_CACHE.labels("embedding", "hit").inc()
+            return list(vector)
+        QUERY_CACHE.labels("embedding", "miss").inc()
+        vector = self._encode([text])[0].tolist()
+        with self._queries_lock:
+            self._queries[text] = tuple(vector)
+        return vector
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(text: str, prompt_template: str, model_name: str) -> str:
+    """
+    Key of an extraction: hash of the normalized input text, hash of the prompt
+    template and the model name. Editing the prompt changes every key, so old
+    entries are never served again and age out through LRU eviction.
+    """
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    prompt_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{text_hash}:{prompt_hash}:{model_name}".encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """On-disk (SQLite) cache of LLM extraction answers with size-based LRU eviction."""
+    def __init__(self, path: str = "./cache/extraction.db",
+                 max_bytes: int = 256 * 1024 * 1024) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until 90% of the budget is left
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
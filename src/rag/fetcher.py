@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from urllib.parse import unquote, urlparse
+
+import gdown
+import requests
+
+from src.rag.sources import zip_members
+
+CHUNK_SIZE = 1 << 20
+DRIVE_HOSTS = ("drive.google.com", "docs.google.com")
+DRIVE_FILE_ID = re.compile(r"/d/([\w-]+)|[?&]id=([\w-]+)")
+DRIVE_FOLDER_ID = re.compile(r"/folders/([\w-]+)")
+# Suffixes of download state kept next to the files: partial data, HTTP validators
+STATE_SUFFIXES = (".part", ".meta")
+
+# One download at a time per target file
+_download_locks = defaultdict(threading.Lock)
+_download_locks_guard = threading.Lock()
+
+
+def url_target(url: str, dest_dir: str) -> str:
+    """Local path of `url`: its file name, prefixed with a hash of the whole URL."""
+    name = unquote(os.path.basename(urlparse(url).path)) or "download"
+    return os.path.join(dest_dir, f"{hashlib.sha256(url.encode()).hexdigest()[:16]}_{name}")
+
+
+def _read_validators(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_validators(path: str, response) -> dict:
+    validators = {key: response.headers[header] for key, header in
+                  (("etag", "ETag"), ("last_modified", "Last-Modified")) if header in response.headers}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(validators, f)
+    return validators
+
+
+def download_url(url: str, dest_dir: str, timeout: float = 60) -> str:
+    """
+    Download `url` into `dest_dir` (see `url_target`), resumable: data goes to
+    `<name>.part` and an interrupted download continues from its size with a
+    Range request, if the server still has the same version (If-Range).
+    A file already downloaded is revalidated with its ETag / Last-Modified,
+    kept in `<name>.meta`, and only fetched again when it changed (always,
+    when the server sends neither). Returns the path of the file.
+    """
+    path = url_target(url, dest_dir)
+    with _download_locks_guard:
+        lock = _download_locks[path]
+    with lock:
+        part, meta = f"{path}.part", f"{path}.meta"
+        headers = {}
+        if os.path.exists(path):
+            validators = _read_validators(meta)
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        part_validators = _read_validators(f"{part}.meta") if offset else {}
+        if part_validators:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = part_validators.get("etag") or part_validators["last_modified"]
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 304:
+                return path
+            if response.status_code != 416:
+                response.raise_for_status()
+                resume = "Range" in headers and response.status_code == 206
+                if not resume:
+                    _write_validators(f"{part}.meta", response)
+                with open(part, "ab" if resume else "wb") as out:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        out.write(chunk)
+            # else: the part file is already complete
+        os.replace(f"{part}.meta", meta)
+        os.replace(part, path)
+        return path
+
+
+def download_drive_file(file_id: str, dest_dir: str, name: str = None) -> str:
+    """
+    Download a Google Drive file into `dest_dir` as `<id>_<name>` (or `<id>.pdf` /
+    `<id>.zip` when the name is unknown). gdown resumes partial downloads,
+    and a file already downloaded is not fetched again.
+    """
+    if name:
+        path = os.path.join(dest_dir, f"{file_id}_{name}")
+        if not os.path.exists(path):
+            gdown.download(id=file_id, output=path, quiet=True, resume=True)
+        return path
+    for ext in (".pdf", ".zip"):
+        if os.path.exists(os.path.join(dest_dir, f"{file_id}{ext}")):
+            return os.path.join(dest_dir, f"{file_id}{ext}")
+    path = os.path.join(dest_dir, file_id)
+    gdown.download(id=file_id, output=path, quiet=True, resume=True)
+    final = f"{path}.zip" if zipfile.is_zipfile(path) else f"{path}.pdf"
+    os.replace(path, final)
+    return final
+
+
+def pdf_sources(path: str) -> List[str]:
+    """PDF sources in a fetched file: itself, or the PDF members of a ZIP archive."""
+    if zipfile.is_zipfile(path):
+        return zip_members(path)
+    if path.lower().endswith(".pdf"):
+        return [path]
+    with open(path, "rb") as f:
+        return [path] if f.read(5) == b"%PDF-" else []
+
+
+def fetch_pdfs(sources: List[str], dest_dir: str = "./data_source/generative_ai/curriculum_vitae_data",
+               workers: int = 8) -> List[str]:
+    """
+    PDF sources of local paths, ZIP files, URLs and Google Drive file/folder
+    links, only those of this call. Downloads run on `workers` threads and
+    resume where an earlier attempt stopped. ZIP archives are not extracted:
+    their PDFs are returned as "<archive>.zip!/<member>" sources, which the
+    loader reads from the archive. A source that fails to download is
+    reported and skipped.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    pdf_paths, downloads = [], []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for src in sources:
+            if src.startswith(("http://", "https://")):
+                host = urlparse(src).netloc
+                folder = DRIVE_FOLDER_ID.search(src)
+                file_id = DRIVE_FILE_ID.search(src)
+                if host in DRIVE_HOSTS and folder:
+                    # List the folder, then download its files concurrently
+                    files = gdown.download_folder(url=src, output=dest_dir, quiet=True,
+                                                  use_cookies=False, skip_download=True) or []
+                    downloads.extend((src, executor.submit(download_drive_file, file.id, dest_dir,
+                                                           os.path.basename(file.path)))
+                                     for file in files)
+                elif host in DRIVE_HOSTS and file_id:
+                    downloads.append((src, executor.submit(download_drive_file,
+                                                           file_id.group(1) or file_id.group(2), dest_dir)))
+                else:
+                    downloads.append((src, executor.submit(download_url, src, dest_dir)))
+
+            elif os.path.isdir(src):
+                # PDFs and ZIP archives under the folder, recursively
+                for path in sorted(Path(src).rglob("*")):
+                    if path.is_file() and path.suffix not in STATE_SUFFIXES:
+                        pdf_paths.extend(pdf_sources(str(path.resolve())))
+
+            elif os.path.isfile(src):
+                pdf_paths.extend(pdf_sources(src))
+
+        for src, future in downloads:
+            try:
+                pdf_paths.extend(pdf_sources(future.result()))
+            except Exception as e:
+                print(f"Failed to fetch {src}: {type(e).__name__}: {e}")
+
+    return list(dict.fromkeys(pdf_paths))
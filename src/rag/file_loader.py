@@ -2,130 +2,157 @@ from typing import Union, List, Literal
 import glob
 import os
 from tqdm import tqdm
+import io
 import multiprocessing
-import gdown
-from pathlib import Path
-import zipfile
 import json
+from functools import partial
 from langchain_community.document_loaders import PyPDFLoader, BSHTMLLoader
+from langchain_community.document_loaders.blob_loaders import Blob
+from langchain_community.document_loaders.parsers.pdf import PyPDFParser
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-
-def fetch_pdfs(sources: List[str], dest_dir: str = "./data_source/generative_ai/curriculum_vitae_data") -> List[str]:
-    """Fetch pdf files from local paths, ZIP files, or Google Drive links."""
-    os.makedirs(dest_dir, exist_ok=True)
-    pdf_paths = []
-
-    for src in sources:
-        if src.startswith("http"):
-            # Handle Google Drive links
-            if "folders" in src:
-                # Google Drive FOLDER
-                gdown.download_folder(url=src, output=dest_dir, quiet=False, use_cookies=False)
-            else:
-                # Google Drive FILE (could be PDF or ZIP)
-                filename = os.path.basename(src)
-                download_path = os.path.join(dest_dir, filename)
-                gdown.download(url=src, output=download_path, quiet=True, fuzzy=True)
-
-                if zipfile.is_zipfile(download_path):
-                    with zipfile.ZipFile(download_path, "r") as zip_ref:
-                        zip_ref.extractall(dest_dir)
-                    os.remove(download_path)
-                elif download_path.endswith(".pdf"):
-                    pdf_paths.append(download_path)
-
-        elif os.path.isdir(src):
-            # Add all PDFs from the folder recursively
-            for pdf_file in Path(src).rglob("*.pdf"):
-                pdf_paths.append(str(pdf_file.resolve()))
-
-        elif os.path.isfile(src):
-            if src.endswith(".pdf"):
-                pdf_paths.append(src)
-            elif zipfile.is_zipfile(src):
-                with zipfile.ZipFile(src, "r") as zip_ref:
-                    zip_ref.extractall(dest_dir)
-
-    # Finally, collect all PDFs under dest_dir
-    for pdf_file in Path(dest_dir).rglob("*.pdf"):
-        pdf_paths.append(str(pdf_file.resolve()))
-
-    return list(set(pdf_paths))
-
-
-
-def remove_non_utf8_characters(text):
-    return ''.join(char for char in text if ord(char) < 128)
-
-def load_pdf(pdf_file):
-    docs = PyPDFLoader(pdf_file, extract_images=True).load()
+from src.rag.worker_pool import WorkerPool
+from src.rag.text_normalizer import NormalizationPolicy, DEFAULT_POLICY, normalize_text
+from src.base.metrics import timed
+from src.rag.fetcher import STATE_SUFFIXES, pdf_sources
+from src.rag.ocr import ocr_available, ocr_process
+from src.rag.sources import split_zip_member, read_source
+
+# Pages with less text than this are treated as scanned and sent to OCR
+MIN_PAGE_CHARS = 50
+OCR_PAGE_TIMEOUT = 20.0
+OCR_MAX_PAGES = 10
+
+_ocr_missing = False
+
+
+def ocr_pages(pdf_file, page_numbers: List[int], timeout: float = OCR_PAGE_TIMEOUT) -> dict:
+    """
+    OCR the given pages of a PDF, each within `timeout` seconds, in this
+    process's OCR child process, which is killed when a page runs over.
+    Returns {page number: text} for the pages that finished in time.
+    """
+    global _ocr_missing
+    if not page_numbers or _ocr_missing:
+        return {}
+    if not ocr_available():
+        print("rapidocr-onnxruntime is not installed: scanned PDF pages are indexed without OCR")
+        _ocr_missing = True
+        return {}
+    if isinstance(pdf_file, io.BytesIO):
+        data = pdf_file.getvalue()
+    else:
+        with open(pdf_file, "rb") as f:
+            data = f.read()
+    try:
+        results = ocr_process().ocr_pages(data, page_numbers, timeout)
+    except RuntimeError as e:
+        print(f"OCR failed on {pdf_file}: {e}")
+        return {}
+    texts = {}
+    for number, text in results.items():
+        if isinstance(text, TimeoutError):
+            print(f"OCR timed out on page {number} of {pdf_file}")
+        elif isinstance(text, Exception):
+            print(f"OCR failed on page {number} of {pdf_file}: {text}")
+        else:
+            texts[number] = text
+    return texts
+
+
+def load_pdf(pdf_file, min_chars: int = MIN_PAGE_CHARS, max_ocr_pages: int = OCR_MAX_PAGES,
+             policy: NormalizationPolicy = DEFAULT_POLICY):
+    """
+    Load a PDF from its text layer. Only pages with (almost) no text, i.e.
+    scanned pages, go through OCR, at most `max_ocr_pages` per document.
+    Page text is normalized according to `policy`.
+    A "<archive>.zip!/<member>" source is read from the archive in memory.
+    """
+    data = None
+    with timed("pdf_parse", items=1):
+        if split_zip_member(pdf_file)[0] is not None:
+            data = read_source(pdf_file)
+            docs = list(PyPDFParser().lazy_parse(Blob.from_data(data, path=pdf_file)))
+        else:
+            docs = PyPDFLoader(pdf_file).load()
+    pages = {doc.metadata.get("page", n): doc for n, doc in enumerate(docs)}
+    scanned = [n for n, doc in pages.items() if len(doc.page_content.strip()) < min_chars][:max_ocr_pages]
+    if scanned:
+        with timed("ocr", items=len(scanned)):
+            texts = ocr_pages(io.BytesIO(data) if data is not None else pdf_file, scanned)
+        for n, text in texts.items():
+            pages[n].page_content = f"{pages[n].page_content}\n{text}".strip()
     for doc in docs:
-        doc.page_content = remove_non_utf8_characters(doc.page_content)
+        doc.page_content = normalize_text(doc.page_content, policy)
     return docs
 
-def load_cv(file_path):
-    loader = PyPDFLoader(file_path)
-    docs = loader.load()
-    return docs
-
-def load_from_sources(sources: List[str]) -> List:
-    files = fetch_pdfs(sources)
-    docs = []
-    for f in files:
-        docs.extend(load_cv(f))
-    return docs
-
-def load_html(html_file):
-    docs = BSHTMLLoader(html_file).load()
+def load_html(html_file, policy: NormalizationPolicy = DEFAULT_POLICY):
+    # html.parser ships with Python; BSHTMLLoader defaults to lxml, which is not a dependency
+    with timed("html_parse", items=1):
+        docs = BSHTMLLoader(html_file, bs_kwargs={"features": "html.parser"}).load()
     for doc in docs:
-        doc.page_content = remove_non_utf8_characters(doc.page_content)
+        doc.page_content = normalize_text(doc.page_content, policy)
     return docs
 
-def split_documents(docs):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    return splitter.split_documents(docs)
 def get_num_cpu():
     return multiprocessing.cpu_count()
 
+def parse_or_error(parse, path: str):
+    """(path, documents, None), or (path, [], error message) when `parse` fails on the file."""
+    try:
+        return path, parse(path), None
+    except Exception as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
 class BaseLoader:
-    def __init__(self) -> None:
+    """
+    Parses files on a WorkerPool. A file that fails to parse is reported and
+    skipped (with its error in `errors`, when given) instead of failing the
+    others.
+    """
+    # Parses a single file; module-level so worker processes can pickle it
+    parse_file = None
+    desc = "Loading files"
+
+    def __init__(self, pool: WorkerPool = None, policy: NormalizationPolicy = DEFAULT_POLICY) -> None:
         self.num_processes = get_num_cpu()
-
-    def __call__(self, files: List[str], **kwargs):
-        pass
+        self.pool = pool
+        self.load_file = partial(parse_or_error, partial(self.parse_file, policy=policy))
+
+    def __call__(self, files: List[str], errors: dict = None, **kwargs):
+        workers = min(self.num_processes, kwargs.get("workers", self.num_processes))
+        if self.pool is not None:
+            return self._load(self.pool, files, workers, errors)
+        # No shared pool (scripts, notebooks): one for this call only
+        pool = WorkerPool(processes=min(workers, len(files)), context=None)
+        if not pool.runs_inline(len(files), workers):
+            pool.start()
+        try:
+            return self._load(pool, files, workers, errors)
+        finally:
+            pool.stop()
+
+    def _load(self, pool: WorkerPool, files: List[str], workers: int, errors: dict = None):
+        doc_loaded = []
+        with tqdm(total=len(files), desc=self.desc, unit="file") as pbar:
+            for path, docs, error in pool.imap_unordered(self.load_file, files, workers=workers):
+                if error is not None:
+                    print(f"Skipping {path}: {error}")
+                    if errors is not None:
+                        errors[path] = error
+                doc_loaded.extend(docs)
+                pbar.update(1)
+        return doc_loaded
 
 
 class PDFLoader(BaseLoader):
-    def __init__(self) -> None:
-        super().__init__()
-
-    def __call__(self, pdf_files: List[str], **kwargs):
-        num_processes = min(self.num_processes, kwargs["workers"])
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            doc_loaded = []
-            total_files = len(pdf_files)
-            with tqdm(total=total_files, desc="Loading PDFs", unit="file") as pbar:
-                for result in pool.imap_unordered(load_pdf, pdf_files):
-                    doc_loaded.extend(result)
-                    pbar.update(1)
-        return doc_loaded
+    parse_file = staticmethod(load_pdf)
+    desc = "Loading PDFs"
 
 
 class HTMLLoader(BaseLoader):
-    def __init__(self) -> None:
-        super().__init__()
-
-    def __call__(self, html_files: List[str], **kwargs):
-        num_processes = min(self.num_processes, kwargs["workers"])
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            doc_loaded = []
-            total_files = len(html_files)
-            with tqdm(total=total_files, desc="Loading HTMLs", unit="file") as pbar:
-                for result in pool.imap_unordered(load_html, html_files):
-                    doc_loaded.extend(result)
-                    pbar.update(1)
-        return doc_loaded
+    parse_file = staticmethod(load_html)
+    desc = "Loading HTMLs"
 
 
 class TextSplitter:
@@ -141,7 +168,8 @@ class TextSplitter:
             chunk_overlap=chunk_overlap,
         )
     def __call__(self, documents):
-        return self.splitter.split_documents(documents)
+        with timed("split", items=len(documents)):
+            return self.splitter.split_documents(documents)
 
 
 
@@ -150,33 +178,47 @@ class Loader:
                  file_type: str = Literal["pdf", "html"],
                  split_kwargs: dict = {
                      "chunk_size": 300,
-                     "chunk_overlap": 0}
+                     "chunk_overlap": 0},
+                 pool: WorkerPool = None,
+                 normalization: NormalizationPolicy = DEFAULT_POLICY
                  ) -> None:
         assert file_type in ["pdf", "html"], "file_type must be either pdf or html"
         self.file_type = file_type
+        self.pool = pool
+        self.normalization = normalization
         if file_type == "pdf":
-            self.doc_loader = PDFLoader()
+            self.doc_loader = PDFLoader(pool, normalization)
         elif file_type == "html":
-            self.doc_loader = HTMLLoader()
+            self.doc_loader = HTMLLoader(pool, normalization)
         else:
             raise ValueError("file_type must be either pdf or html")
 
+        self.split_kwargs = split_kwargs
         self.doc_spltter = TextSplitter(**split_kwargs)
 
-    def load(self, pdf_files: Union[str, List[str]], workers: int = 1):
+    def load(self, pdf_files: Union[str, List[str]], workers: int = 1, errors: dict = None):
+        """Chunks of the files; those that fail to parse are skipped, see BaseLoader."""
         if isinstance(pdf_files, str):
             pdf_files = [pdf_files]
-        doc_loaded = self.doc_loader(pdf_files, workers=workers)
+        doc_loaded = self.doc_loader(pdf_files, errors=errors, workers=workers)
         doc_split = self.doc_spltter(doc_loaded)
         return doc_split
 
-    def load_dir(self, dir_path: str, workers: int = 1):
+    def list_dir(self, dir_path: str):
         if self.file_type == "pdf":
-            files = glob.glob(f"{dir_path}/*.pdf")
-            assert len(files) > 0, f"No {self.file_type} files found in {dir_path}"
+            # Same test as fetched files (any case, or no extension with a PDF header);
+            # PDFs inside ZIP archives are read in place, not extracted
+            paths = [os.path.join(dir_path, name) for name in os.listdir(dir_path)] if os.path.isdir(dir_path) else []
+            files = [source for path in paths
+                     if os.path.isfile(path) and not path.endswith(STATE_SUFFIXES)
+                     for source in pdf_sources(path)]
         else:
             files = glob.glob(f"{dir_path}/*.html")
-            assert len(files) > 0, f"No {self.file_type} files found in {dir_path}"
+        return sorted(files)
+
+    def load_dir(self, dir_path: str, workers: int = 1):
+        files = self.list_dir(dir_path)
+        assert len(files) > 0, f"No {self.file_type} files found in {dir_path}"
         return self.load(files, workers=workers)
     
 class Exporter:
@@ -0,0 +1,300 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from langchain_core.runnables import RunnableLambda
+
+from src.base.metrics import record
+from src.rag.file_loader import Loader
+from src.rag.manifest import source_key
+from src.rag.vectorstore import CandidateDB
+from src.rag.ann_index import IndexConfig
+from src.rag.worker_pool import WorkerPool
+
+
+class IndexNotReady(Exception):
+    """Raised when the candidate index is requested before it is ready."""
+    def __init__(self, status: str, retry_after: int = 5) -> None:
+        super().__init__(f"Candidate index is not ready (status: {status})")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class IndexManager:
+    """
+    Owns the single CandidateDB shared by search, upload and the RAG chain.
+
+    A background writer thread loads the embedding model and the index (an
+    index found in `persist_dir` is served right away, then new or changed
+    files under `data_dir` are streamed in batch by batch) and afterwards
+    applies every write.
+    Writes are queued and batched: each batch is loaded and embedded, then
+    committed in one step (see CandidateDB.commit), so searches never see
+    part of a batch.
+
+    Persistence is debounced: a flusher thread writes the latest snapshot
+    every `flush_interval` seconds, or as soon as `flush_threshold` chunks
+    changed, and once more on shutdown.
+
+    Searches are hybrid (BM25 + vectors) unless `lexical` is off; an optional
+    `reranker` (CrossEncoderReranker) is loaded by the writer thread too.
+    `on_remove` is called with the sources pruned from the index (see CandidateDB).
+
+    With `read_only`, this process only serves the index written by another
+    one (see src/worker.py): a watcher thread maps the current generation and
+    swaps in each new one within `watch_interval` seconds. Nothing can be
+    submitted; uploads are queued as ingestion jobs for the writer.
+    """
+    LOADING = "loading"
+    READY = "ready"
+    DEGRADED = "degraded"
+
+    def __init__(self,
+                 data_dir: str,
+                 data_type: str = "pdf",
+                 persist_dir: str = "./vectorstore",
+                 workers: int = 7,
+                 max_batch: int = 16,
+                 flush_interval: float = 30.0,
+                 flush_threshold: int = 5000,
+                 index_config: IndexConfig = None,
+                 pool: WorkerPool = None,
+                 embedding_model=None,
+                 lexical: bool = True,
+                 reranker=None,
+                 read_only: bool = False,
+                 watch_interval: float = 1.0,
+                 on_remove=None) -> None:
+        self.data_dir = data_dir
+        self.persist_dir = persist_dir
+        self.workers = workers
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.index_config = index_config
+        self.embedding_model = embedding_model
+        self.lexical = lexical
+        self.reranker = reranker
+        self.read_only = read_only
+        self.watch_interval = watch_interval
+        self.on_remove = on_remove
+        self.loader = Loader(file_type=data_type, pool=pool)
+        self.db = None
+        self.status = self.LOADING
+        self.error = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._flusher = None
+        self._flush_now = threading.Event()
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread is None and self.read_only:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+            self._thread.start()
+        elif self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="index-writer", daemon=True)
+            self._thread.start()
+            self._flusher = threading.Thread(target=self._flush_loop, name="index-flusher", daemon=True)
+            self._flusher.start()
+
+    def stop(self, timeout: float = None):
+        if self._thread is not None:
+            self._queue.put(None)
+            if self.read_only:
+                self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+        if self._flusher is not None:
+            self._stopping.set()
+            self._flush_now.set()
+            self._flusher.join(timeout)
+            self._flusher = None
+
+    def _flush_loop(self):
+        while True:
+            self._flush_now.wait(self.flush_interval)
+            self._flush_now.clear()
+            try:
+                if self.db is not None:
+                    self.db.flush()
+            except Exception:
+                traceback.print_exc()
+            if self._stopping.is_set():
+                break
+
+    def _run(self):
+        try:
+            db = CandidateDB(persist_dir=self.persist_dir, embedding_model=self.embedding_model,
+                             index_config=self.index_config, lexical=self.lexical, on_remove=self.on_remove)
+            self.db = db
+            if db.load_db() is not None:
+                self.status = self.READY
+            if self.reranker is not None:
+                # Searches use the fused ranking until the model is loaded
+                try:
+                    self.reranker.load()
+                    db.reranker = self.reranker
+                except Exception as e:
+                    print(f"Re-ranker disabled: {type(e).__name__}: {e}")
+            db.stream_sync(self.loader.list_dir(self.data_dir), self.loader,
+                           workers=self.workers, prune=True, on_commit=self._after_commit)
+            self._flush_now.set()
+        except Exception as e:
+            traceback.print_exc()
+            self._set_status(e)
+        if self.db is not None:
+            self._write_loop()
+
+    def _watch(self):
+        error = None
+        try:
+            self.db = CandidateDB(persist_dir=self.persist_dir, embedding_model=self.embedding_model,
+                                  index_config=self.index_config, lexical=self.lexical, read_only=True)
+        except Exception as e:
+            traceback.print_exc()
+            self.error, self.status = f"{type(e).__name__}: {e}", self.DEGRADED
+            return
+        while True:
+            try:
+                if self.db.refresh():
+                    print(f"Serving index generation {os.path.basename(self.db.generation)}")
+                error = None
+            except Exception as e:
+                # e.g. the writer pruned the generation while it was loading: retried next time
+                if str(e) != str(error):
+                    print(f"Index refresh failed: {type(e).__name__}: {e}")
+                error = e
+            self._set_status(error)
+            if self.reranker is not None and self.db.reranker is None and self.db.db is not None:
+                try:
+                    self.reranker.load()
+                    self.db.reranker = self.reranker
+                except Exception as e:
+                    print(f"Re-ranker disabled: {type(e).__name__}: {e}")
+                    self.reranker = None
+            if self._stopping.wait(self.watch_interval):
+                break
+
+    def _after_commit(self):
+        self._set_status()
+        if self.db.dirty >= self.flush_threshold:
+            self._flush_now.set()
+
+    def _set_status(self, error: Exception = None):
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        elif self.db.db is None:
+            self.error = "index is empty"
+        else:
+            self.error = None
+        ready = self.db is not None and self.db.db is not None
+        self.status = self.READY if ready else self.DEGRADED
+
+    def _write_loop(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+
+    def _apply(self, batch):
+        prepared = []
+        for sources, prune, future, context, queued in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Run in the submitter's context, so stage timings count towards its request
+            context.run(record, "index_queue", time.perf_counter() - queued)
+            try:
+                update = context.run(self.db.prepare, sources, self.loader, workers=self.workers, prune=prune)
+                prepared.append((update, future, context))
+            except Exception as e:
+                future.set_exception(e)
+        if not prepared:
+            return
+        start = time.perf_counter()
+        try:
+            self.db.commit([update for update, _, _ in prepared])
+        except Exception as e:
+            traceback.print_exc()
+            for _, future, _ in prepared:
+                future.set_exception(e)
+            return
+        self._after_commit()
+        elapsed = time.perf_counter() - start
+        for update, future, context in prepared:
+            context.run(record, "index_commit", elapsed)
+            future.set_result(update)
+
+    def health(self) -> dict:
+        health = {"index": self.status}
+        if self.error:
+            health["index_error"] = self.error
+        if self.db is not None:
+            health["index_version"] = self.db.version
+        if self.db is not None and self.db.generation is not None:
+            health["index_generation"] = os.path.basename(self.db.generation)
+        if self.db is not None and self.db.ingest_progress is not None:
+            health["ingest"] = dict(self.db.ingest_progress)
+        return health
+
+    def get_db(self) -> CandidateDB:
+        if self.db is None or self.db.db is None:
+            raise IndexNotReady(self.status)
+        return self.db
+
+    def submit(self, sources, prune: bool = False) -> Future:
+        """
+        Queue `sources` for indexing. The future resolves to the committed
+        PendingUpdate: their new chunks (`docs`) and the sources that failed
+        to parse (`failed`).
+        """
+        if self.read_only:
+            raise RuntimeError("This index is read-only: queue uploads as ingestion jobs")
+        if self.db is None:
+            raise IndexNotReady(self.status)
+        future = Future()
+        self._queue.put((list(sources), prune, future, contextvars.copy_context(), time.perf_counter()))
+        return future
+
+    def indexed(self, path: str, digest: str) -> bool:
+        """Whether `path` is in the index with this content hash."""
+        manifest = self.db.manifest if self.db is not None else None
+        entry = manifest.files.get(source_key(path)) if manifest is not None else None
+        return entry is not None and entry["hash"] == digest
+
+    def documents(self, path: str) -> list:
+        """The indexed chunks of `path`, from the current snapshot."""
+        db = self.get_db()
+        return [doc for doc in (db.db.docstore.search(id_) for id_ in db.manifest.ids_for(path))
+                if not isinstance(doc, str)]
+
+    def sync(self, sources):
+        """Index `sources` (uploads) and return their new chunks."""
+        return self.submit(sources).result().docs
+
+    def search(self, query, k=3, **search_kwargs):
+        return self.get_db().search(query, k=k, **search_kwargs)
+
+    def search_candidates(self, query, k=5, sources=None, **search_kwargs):
+        return self.get_db().search_candidates(query, k=k, sources=sources, **search_kwargs)
+
+    def as_retriever(self, k=3):
+        return RunnableLambda(lambda query: self.search(query, k=k))
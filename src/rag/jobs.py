@@ -0,0 +1,359 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.rag.fetcher import fetch_pdfs
+from src.rag.index_manager import IndexNotReady
+from src.rag.manifest import source_key
+from src.rag.sources import source_hash
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# File states: queued -> indexed -> extracted, or duplicate / empty / failed
+FILE_DONE = ("extracted", "duplicate", "empty")
+# Record keys that are not extracted fields
+RECORD_META = ("source", "filename", "errors")
+
+
+def has_profile(record: dict) -> bool:
+    """Whether an extraction record holds extracted fields, not just errors."""
+    return record is not None and any(key not in RECORD_META for key in record)
+
+
+class JobStore:
+    """
+    Persistent ingestion job queue (SQLite, WAL): one row per job and one per
+    file of the job, with its state, error and extracted record. Jobs are
+    claimed atomically, so several worker processes can share the queue.
+
+    A job is identified by an idempotency key: submitting the same key again
+    returns the existing job (a failed one, or its failed files, are re-queued),
+    or only a job still in progress with `reuse_finished` off. A running job whose
+    heartbeat is older than `lease` seconds is considered abandoned by a
+    crashed worker and is re-queued, up to `max_attempts` runs.
+    """
+    def __init__(self, path: str = "./cache/jobs.db", lease: float = 60, max_attempts: int = 3) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, key TEXT UNIQUE, status TEXT NOT NULL, drive_link TEXT,"
+            " fetched INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0,"
+            " chunks INTEGER NOT NULL DEFAULT 0, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_files ("
+            " job_id TEXT NOT NULL, position INTEGER NOT NULL, name TEXT, source TEXT NOT NULL,"
+            " digest TEXT, status TEXT NOT NULL, error TEXT, record TEXT,"
+            " PRIMARY KEY (job_id, position)) WITHOUT ROWID"
+        )
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _insert_files(self, job_id: str, files: Sequence[Tuple[str, str, str]], start: int = 0):
+        self._conn.executemany(
+            "INSERT INTO job_files (job_id, position, name, source, digest, status) VALUES (?, ?, ?, ?, ?, ?)",
+            [(job_id, start + n, name, source, digest, QUEUED) for n, (name, source, digest) in enumerate(files)])
+
+    def submit(self, files: Sequence[Tuple[str, str, str]], drive_link: str = None,
+               key: str = None, reuse_finished: bool = True) -> Tuple[str, bool]:
+        """
+        Queue a job for `files` ((name, source, content hash) each) and/or a
+        Drive link. Returns (job id, whether it was created).
+        """
+        def work():
+            if key is not None:
+                row = self._conn.execute("SELECT id, status FROM jobs WHERE key = ?", (key,)).fetchone()
+                if row is not None and not reuse_finished and row["status"] in (DONE, FAILED):
+                    # The finished job keeps its results but gives up the key
+                    self._conn.execute("UPDATE jobs SET key = NULL WHERE id = ?", (row["id"],))
+                elif row is not None:
+                    # A failed job, or a finished one with failed files, is retried
+                    retry = row["status"] in (DONE, FAILED) and self._conn.execute(
+                        "UPDATE job_files SET status = ?, error = NULL WHERE job_id = ? AND status = ?",
+                        (QUEUED, row["id"], FAILED)).rowcount
+                    if row["status"] == FAILED or retry:
+                        self._conn.execute("UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated = ? "
+                                           "WHERE id = ?", (QUEUED, time.time(), row["id"]))
+                    return row["id"], False
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._conn.execute("INSERT INTO jobs (id, key, status, drive_link, created, updated) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (job_id, key, QUEUED, drive_link, now, now))
+            self._insert_files(job_id, files)
+            return job_id, True
+        return self._transaction(work)
+
+    def claim(self) -> Optional[dict]:
+        """Take the oldest queued job (abandoned running jobs are re-queued first)."""
+        def work():
+            now = time.time()
+            self._conn.execute("UPDATE jobs SET status = ?, error = 'worker lost', updated = ? "
+                               "WHERE status = ? AND updated < ? AND attempts >= ?",
+                               (FAILED, now, RUNNING, now - self.lease, self.max_attempts))
+            abandoned = self._conn.execute("UPDATE jobs SET status = ?, updated = ? WHERE status = ? AND updated < ?",
+                                           (QUEUED, now, RUNNING, now - self.lease)).rowcount
+            if abandoned:
+                print(f"Re-queued {abandoned} abandoned ingestion job(s)")
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated = ? WHERE id = "
+                "(SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1) RETURNING *",
+                (RUNNING, now, QUEUED)).fetchone()
+            return dict(row) if row is not None else None
+        return self._transaction(work)
+
+    def requeue(self, job_id: str):
+        """Put a claimed job back without counting the attempt (e.g. the index is still loading)."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, attempts = attempts - 1, updated = ? WHERE id = ?",
+                               (QUEUED, time.time(), job_id))
+
+    def heartbeat(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+
+    def add_files(self, job_id: str, files: Sequence[Tuple[str, str, str]]):
+        """Files found by fetching the job's Drive link."""
+        def work():
+            start = self._conn.execute("SELECT COUNT(*) FROM job_files WHERE job_id = ?", (job_id,)).fetchone()[0]
+            self._insert_files(job_id, files, start)
+            self._conn.execute("UPDATE jobs SET fetched = 1 WHERE id = ?", (job_id,))
+        self._transaction(work)
+
+    def update_file(self, job_id: str, position: int, status: str, record: dict = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_files SET status = ?, record = COALESCE(?, record), error = ? "
+                "WHERE job_id = ? AND position = ?",
+                (status, json.dumps(record, ensure_ascii=False) if record is not None else None, error,
+                 job_id, position))
+            self._conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+
+    def add_chunks(self, job_id: str, chunks: int):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET chunks = chunks + ? WHERE id = ?", (chunks, job_id))
+
+    def finish(self, job_id: str, status: str, error: str = None):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                               (status, error, time.time(), job_id))
+
+    def files(self, job_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM job_files WHERE job_id = ? ORDER BY position",
+                                      (job_id,)).fetchall()
+        files = []
+        for row in rows:
+            file = dict(row)
+            file.pop("job_id")
+            file["record"] = json.loads(file["record"]) if file["record"] else None
+            files.append(file)
+        return files
+
+    def get(self, job_id: str, records: bool = False) -> Optional[dict]:
+        """The job with its per-file states and progress; None if unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop("key")
+        job["files"] = self.files(job_id)
+        progress = {}
+        for file in job["files"]:
+            progress[file["status"]] = progress.get(file["status"], 0) + 1
+            if not records:
+                file.pop("record")
+        job["progress"] = {"total": len(job["files"]),
+                           "done": sum(progress.get(status, 0) for status in FILE_DONE), **progress}
+        return job
+
+
+class JobRunner:
+    """
+    Runs ingestion jobs on `workers` asyncio tasks: fetch the Drive link, skip
+    files already indexed (their stored profile is reused, or they are
+    extracted from the stored chunks), index the rest, then extract and store
+    each candidate, recording every step per file. Re-running a job after a
+    crash only redoes the files that had not finished.
+    """
+    def __init__(self, store: JobStore, index, extractor, candidates, upload_dir: str,
+                 workers: int = 2, poll_interval: float = 1.0) -> None:
+        self.store = store
+        self.index = index
+        self.extractor = extractor
+        self.candidates = candidates
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wake = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake an idle worker (a job was just queued)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def wait(self, job_id: str, interval: float = 1.0) -> dict:
+        """The job once it is done or failed (woken by this process's workers, polled otherwise)."""
+        finished = self._finished.setdefault(job_id, asyncio.Event())
+        while True:
+            job = await run_in_threadpool(self.store.get, job_id, True)
+            if job is None or job["status"] in (DONE, FAILED):
+                self._finished.pop(job_id, None)
+                return job
+            try:
+                await asyncio.wait_for(finished.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self):
+        while True:
+            job = await run_in_threadpool(self.store.claim)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            await run_in_threadpool(self.store.heartbeat, job_id)
+
+    async def _run(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            await self._process(job)
+            await run_in_threadpool(self.store.finish, job["id"], DONE)
+        except IndexNotReady as e:
+            await run_in_threadpool(self.store.requeue, job["id"])
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            print(f"Ingestion job {job['id']} failed: {type(e).__name__}: {e}")
+            await run_in_threadpool(self.store.finish, job["id"], FAILED, f"{type(e).__name__}: {e}")
+        finally:
+            heartbeat.cancel()
+            finished = self._finished.pop(job["id"], None)
+            if finished is not None:
+                finished.set()
+
+    def _fetch(self, drive_link: str) -> List[Tuple[str, str, str]]:
+        sources = fetch_pdfs([drive_link], self.upload_dir)
+        return [(os.path.basename(source), source, source_hash(source)) for source in sources]
+
+    def _known(self, pending: List[dict]) -> Tuple[List[dict], List, List[dict]]:
+        """Split pending files into (stored profiles found, chunks of indexed files, files to index)."""
+        profiles = self.candidates.get([file["source"] for file in pending])
+        duplicates, docs, new = [], [], []
+        for file in pending:
+            if file["digest"] and self.index.indexed(file["source"], file["digest"]):
+                profile = profiles.get(source_key(file["source"]))
+                if has_profile(profile):
+                    duplicates.append((file, profile))
+                else:
+                    docs.extend(self.index.documents(file["source"]))
+            else:
+                new.append(file)
+        return duplicates, docs, new
+
+    async def _process(self, job: dict):
+        job_id = job["id"]
+        if job["drive_link"] and not job["fetched"]:
+            fetched = await run_in_threadpool(self._fetch, job["drive_link"])
+            await run_in_threadpool(self.store.add_files, job_id, fetched)
+        files = await run_in_threadpool(self.store.files, job_id)
+        # The same CV given twice in a job is processed once
+        by_source: Dict[str, List[dict]] = {}
+        for file in files:
+            if file["status"] not in FILE_DONE:
+                by_source.setdefault(source_key(file["source"]), []).append(file)
+        if not by_source:
+            return
+        pending = [same[0] for same in by_source.values()]
+        duplicates, docs, new = await run_in_threadpool(self._known, pending)
+        for file, profile in duplicates:
+            await self._update(job_id, by_source.pop(source_key(file["source"])), "duplicate", profile)
+        if new:
+            update = await asyncio.wrap_future(self.index.submit([file["source"] for file in new]))
+            indexed = update.docs
+            await run_in_threadpool(self.store.add_chunks, job_id, len(indexed))
+            docs.extend(indexed)
+            with_chunks = {source_key(doc.metadata.get("source", "")) for doc in indexed}
+            # A file that does not parse fails alone; the others go on
+            failed = {source_key(source): error for source, error in update.failed.items()}
+            for file in new:
+                key = source_key(file["source"])
+                if key in failed:
+                    await self._update(job_id, by_source.pop(key), "failed", error=failed[key])
+                    continue
+                if key not in with_chunks and self.index.indexed(file["source"], file["digest"]):
+                    # Indexed meanwhile by another batch (e.g. the startup sync)
+                    docs.extend(await run_in_threadpool(self.index.documents, file["source"]))
+                elif key not in with_chunks:
+                    await self._update(job_id, by_source.pop(key), "empty", error="no text extracted")
+                    continue
+                await self._update(job_id, by_source[key], "indexed")
+
+        async for _, record in self.extractor.astream_extract(docs):
+            same = by_source.pop(source_key(record.get("source", "")), None)
+            if same is None:
+                continue
+            if same[0]["name"]:
+                record["filename"] = same[0]["name"]
+            errors = record.get("errors")
+            error = "; ".join(map(str, errors)) if errors else None
+            if not has_profile(record):
+                # Not stored: an upload of the same CV extracts it again
+                await self._update(job_id, same, "failed", record, error or "nothing extracted")
+                continue
+            await run_in_threadpool(self.candidates.upsert, [record])
+            await self._update(job_id, same[:1], "extracted", record, error)
+            await self._update(job_id, same[1:], "duplicate", record)
+        for same in by_source.values():
+            await self._update(job_id, same, "failed", error="no record extracted")
+
+    async def _update(self, job_id: str, files: List[dict], status: str, record: dict = None, error: str = None):
+        for file in files:
+            await run_in_threadpool(self.store.update_file, job_id, file["position"], status, record, error)
@@ -0,0 +1,204 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+LEXICAL_FILE = "lexical.npz"
+
+# Keeps skill names such as "c++", "c#", "node.js" and "ci-cd" as one token
+TOKEN = re.compile(r"\w[\w+#]*(?:[.\-]\w[\w+#]*)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound terms ("node.js") also yield their parts."""
+    terms = []
+    for token in TOKEN.findall(text.lower()):
+        terms.append(token)
+        if "." in token or "-" in token:
+            terms.extend(part for part in re.split(r"[.\-]", token) if len(part) > 1)
+    return terms
+
+
+class _Segment:
+    """
+    Immutable block of the inverted index: chunk ids, their lengths, and
+    postings stored CSR-style (term -> slice of `rows`/`tfs`). Deletes only
+    replace the `alive` mask, so a copy of the index shares the postings.
+    """
+    __slots__ = ("ids", "lengths", "alive", "terms", "rows", "tfs")
+
+    def __init__(self, ids, lengths, alive, terms, rows, tfs) -> None:
+        self.ids = ids
+        self.lengths = lengths
+        self.alive = alive
+        self.terms = terms
+        self.rows = rows
+        self.tfs = tfs
+
+    @classmethod
+    def from_postings(cls, ids: List[str], lengths: List[int], postings: Dict[str, list]) -> "_Segment":
+        terms, rows, tfs, start = {}, [], [], 0
+        for term, entries in postings.items():
+            terms[term] = (start, start + len(entries))
+            start += len(entries)
+            rows.extend(row for row, _ in entries)
+            tfs.extend(tf for _, tf in entries)
+        return cls(np.array(ids, dtype=object), np.array(lengths, dtype=np.float32),
+                   np.ones(len(ids), dtype=bool), terms,
+                   np.array(rows, dtype=np.int32), np.array(tfs, dtype=np.float32))
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str]) -> "_Segment":
+        postings, lengths = {}, []
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+        return cls.from_postings(list(ids), lengths, postings)
+
+    @property
+    def live(self) -> int:
+        return int(self.alive.sum())
+
+    def postings(self, term: str):
+        span = self.terms.get(term)
+        if span is None:
+            return None, None
+        rows = self.rows[span[0]:span[1]]
+        return rows, self.tfs[span[0]:span[1]]
+
+    def without(self, ids: set) -> "_Segment":
+        dead = np.fromiter((id_ in ids for id_ in self.ids), dtype=bool, count=len(self.ids))
+        if not (dead & self.alive).any():
+            return self
+        return _Segment(self.ids, self.lengths, self.alive & ~dead, self.terms, self.rows, self.tfs)
+
+
+def _merge(segments: List[_Segment]) -> _Segment:
+    """One segment with the live chunks of `segments`."""
+    ids, lengths, postings, offset = [], [], {}, 0
+    for segment in segments:
+        new_rows = np.cumsum(segment.alive) - 1 + offset
+        ids.extend(segment.ids[segment.alive])
+        lengths.extend(segment.lengths[segment.alive].tolist())
+        for term, (start, end) in segment.terms.items():
+            rows = segment.rows[start:end]
+            keep = segment.alive[rows]
+            if keep.any():
+                postings.setdefault(term, []).extend(
+                    zip(new_rows[rows[keep]].tolist(), segment.tfs[start:end][keep].tolist()))
+        offset += segment.live
+    return _Segment.from_postings(ids, lengths, postings)
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunk texts, kept next to the FAISS index
+    and keyed by the same docstore ids. It follows the same copy-on-write
+    snapshots: `copy` is cheap (segments are shared), `add` appends a segment
+    and `delete` masks rows. Small segments are merged as they pile up,
+    log-structured, so adds stay incremental and searches touch few segments.
+    """
+    def __init__(self, segments: List[_Segment] = None, k1: float = 1.2, b: float = 0.75) -> None:
+        self.segments = list(segments or [])
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str]) -> "LexicalIndex":
+        index = cls()
+        index.add(ids, texts)
+        return index
+
+    def __len__(self) -> int:
+        return sum(segment.live for segment in self.segments)
+
+    def copy(self) -> "LexicalIndex":
+        return LexicalIndex(self.segments, self.k1, self.b)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        if not ids:
+            return
+        self.segments.append(_Segment.build(ids, texts))
+        # Merge while the previous segment is not much larger than the newest one
+        while len(self.segments) > 1 and self.segments[-2].live <= 2 * self.segments[-1].live:
+            self.segments[-2:] = [_merge(self.segments[-2:])]
+
+    def delete(self, ids: Iterable[str]):
+        ids = set(ids)
+        if ids:
+            self.segments = [segment.without(ids) for segment in self.segments]
+            self.segments = [segment for segment in self.segments if segment.live]
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top `k` (chunk id, BM25 score) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.segments:
+            return []
+        n = len(self)
+        avgdl = sum(float(s.lengths[s.alive].sum()) for s in self.segments) / max(n, 1)
+        found = [(segment, {term: segment.postings(term) for term in terms}) for segment in self.segments]
+        idf = {}
+        for term in terms:
+            df = 0
+            for segment, postings in found:
+                rows = postings[term][0]
+                if rows is not None:
+                    df += int(segment.alive[rows].sum())
+            if df:
+                idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        if not idf:
+            return []
+        hits = []
+        for segment, postings in found:
+            scores = np.zeros(len(segment.ids), dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * segment.lengths / avgdl)
+            for term, weight in idf.items():
+                rows, tfs = postings[term]
+                if rows is not None:
+                    scores[rows] += weight * tfs * (self.k1 + 1) / (tfs + norm[rows])
+            scores[~segment.alive] = 0
+            top = np.flatnonzero(scores)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k - 1)[:k]]
+            hits.extend((segment.ids[row], float(scores[row])) for row in top)
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:k]
+
+    def save(self, path: str):
+        segment = self.segments[0] if len(self.segments) == 1 else _merge(self.segments)
+        if not segment.alive.all():
+            segment = _merge([segment])
+        terms = sorted(segment.terms, key=lambda term: segment.terms[term][0])
+        offsets = np.array([segment.terms[term][0] for term in terms] + [len(segment.rows)], dtype=np.int64)
+        np.savez(os.path.join(path, LEXICAL_FILE), ids=np.array(segment.ids, dtype=str),
+                 lengths=segment.lengths, terms=np.array(terms, dtype=str), offsets=offsets,
+                 rows=segment.rows, tfs=segment.tfs, params=np.array([self.k1, self.b]))
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """The index saved in `path`, or None if there is none."""
+        file = os.path.join(path, LEXICAL_FILE)
+        if not os.path.exists(file):
+            return None
+        with np.load(file) as data:
+            offsets = data["offsets"].tolist()
+            terms = {term: (offsets[i], offsets[i + 1]) for i, term in enumerate(data["terms"].tolist())}
+            ids = np.array(data["ids"].tolist(), dtype=object)
+            segment = _Segment(ids, data["lengths"], np.ones(len(ids), dtype=bool), terms,
+                               data["rows"], data["tfs"])
+            k1, b = data["params"].tolist()
+        return cls([segment] if len(ids) else [], k1, b)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[str]:
+    """Ids ordered by their summed 1 / (k + rank) over the rankings."""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, 1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda id_: -scores[id_])
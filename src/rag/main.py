@@ -1,7 +1,6 @@
 from pydantic import BaseModel, Field
 
-from src.rag.file_loader import Loader
-from src.rag.vectorstore import CandidateDB
+from src.rag.index_manager import IndexManager
 from src.rag.offline_rag import Offline_RAG
 
 
@@ -12,11 +11,10 @@ class OutputQA(BaseModel):
     answer: str = Field(..., title="Answer from the model")
 
 
-def build_rag_chain(llm, data_dir, data_type):
-    doc_loaded = Loader(file_type=data_type).load_dir(data_dir, workers=7)
-    db = CandidateDB()
-    db.build_db(doc_loaded)
-    retriever = db.get_retriever()
+def build_rag_chain(llm, index: IndexManager):
+    # The retriever resolves the index per query, so the chain can be built
+    # (and served) before the index has finished loading
+    retriever = index.as_retriever()
     rag_chain = Offline_RAG(llm).get_chain(retriever)
     return rag_chain
 
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Tuple
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_key(path: str) -> str:
+    return os.path.normpath(path)
+
+
+class IngestManifest:
+    """
+    Persistent record of the source files already parsed, chunked and embedded
+    into the vector store, keyed by file path with the content hash and the
+    vector ids of its chunks.
+
+    `params` captures everything that changes the produced vectors (chunking
+    parameters, embedding model). A manifest written with different params is
+    treated as incompatible and the index has to be rebuilt. Without
+    `params`, the stored ones are taken as they are (read-only use).
+    """
+    def __init__(self, path: str, params: dict = None) -> None:
+        self.path = path
+        self.params = params
+        self.files: Dict[str, dict] = {}
+        self.compatible = False
+        self.load()
+
+    def load(self):
+        self.files = {}
+        self.compatible = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if self.params is None:
+            self.params = data.get("params")
+        if data.get("params") == self.params:
+            self.files = data.get("files", {})
+            self.compatible = True
+
+    @staticmethod
+    def write(path: str, params: dict, files: Dict[str, dict]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "files": files}, f)
+        os.replace(tmp_path, path)
+
+    def save(self):
+        self.write(self.path, self.params, self.files)
+        self.compatible = True
+
+    def snapshot(self) -> Dict[str, dict]:
+        # Entries are replaced, never mutated, so a shallow copy is stable
+        return dict(self.files)
+
+    def reset(self):
+        self.files = {}
+        self.compatible = True
+
+    def diff(self, paths: List[str], prune: bool = False,
+             hasher: Callable[[str], str] = file_hash) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Compare `paths` against the manifest, content hashed with `hasher`.
+        Returns ({path: hash} of new or changed files, [removed paths]).
+        Removed paths are only reported when `prune` is set, i.e. when `paths`
+        is the full corpus rather than a batch of uploads.
+        """
+        changed = {}
+        seen = set()
+        for path in paths:
+            key = source_key(path)
+            seen.add(key)
+            digest = hasher(path)
+            entry = self.files.get(key)
+            if entry is None or entry["hash"] != digest:
+                changed[key] = digest
+        removed = [key for key in self.files if key not in seen] if prune else []
+        return changed, removed
+
+    def ids_for(self, path: str) -> List[str]:
+        entry = self.files.get(source_key(path))
+        return entry["ids"] if entry else []
+
+    def record(self, path: str, digest: str, ids: List[str]):
+        self.files[source_key(path)] = {"hash": digest, "ids": ids}
+
+    def forget(self, path: str) -> List[str]:
+        entry = self.files.pop(source_key(path), None)
+        return entry["ids"] if entry else []
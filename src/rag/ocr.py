@@ -0,0 +1,148 @@
+"""
+OCR of scanned PDF pages with RapidOCR, run in a child process so a page that
+hangs can be stopped: a thread stuck in the OCR engine cannot be interrupted,
+a process can be killed.
+"""
+import importlib.util
+import io
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Union
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_ocr_engine = None
+
+
+def ocr_available() -> bool:
+    return importlib.util.find_spec("rapidocr_onnxruntime") is not None
+
+
+def get_ocr_engine():
+    """RapidOCR engine, created once per process."""
+    global _ocr_engine
+    if _ocr_engine is None:
+        from rapidocr_onnxruntime import RapidOCR
+        _ocr_engine = RapidOCR()
+    return _ocr_engine
+
+
+def ocr_page(page) -> str:
+    """Text of the images on a pypdf page."""
+    engine = get_ocr_engine()
+    texts = []
+    for image in page.images:
+        result, _ = engine(image.data)
+        if result:
+            texts.append("\n".join(line[1] for line in result))
+    return "\n".join(texts)
+
+
+def serve():
+    """
+    Child process loop: read pickled (PDF bytes, page numbers) requests from
+    stdin and write one pickled (ok, text or error) reply per page to stdout.
+    """
+    from pypdf import PdfReader
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # Anything the engine prints must not corrupt the replies
+    sys.stdout = sys.stderr
+    while True:
+        try:
+            data, page_numbers = pickle.load(stdin)
+        except EOFError:
+            return
+        reader = None
+        for number in page_numbers:
+            try:
+                reader = reader or PdfReader(io.BytesIO(data))
+                reply = (True, ocr_page(reader.pages[number]))
+            except Exception as e:
+                reply = (False, f"{type(e).__name__}: {e}")
+            pickle.dump(reply, stdout)
+            stdout.flush()
+
+
+class OCRProcess:
+    """
+    Client of an OCR child process, started on first use and kept for the
+    next documents (the engine is loaded once). When a page takes longer than
+    the timeout, the process is killed and a new one goes on with the next page.
+    """
+    def __init__(self) -> None:
+        self._process = None
+        self._replies = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        path = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+        self._process = subprocess.Popen([sys.executable, "-c", "from src.rag.ocr import serve; serve()"],
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         env=dict(os.environ, PYTHONPATH=path))
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read, args=(self._process.stdout, self._replies),
+                         name="ocr-reader", daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, replies: queue.Queue):
+        while True:
+            try:
+                replies.put(pickle.load(stdout))
+            except Exception:
+                # EOF: the process exited or was killed
+                replies.put(None)
+                return
+
+    def kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def _receive(self, timeout: float):
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            return TimeoutError(f"no result within {timeout:g}s")
+        if reply is None:
+            self.kill()
+            return RuntimeError("OCR process exited")
+        ok, value = reply
+        return value if ok else RuntimeError(value)
+
+    def ocr_pages(self, data: bytes, page_numbers: List[int], timeout: float) -> Dict[int, Union[str, Exception]]:
+        """{page number: text, or the error (TimeoutError past `timeout` seconds)} for each page of the PDF `data`."""
+        results = {}
+        with self._lock:
+            while len(results) < len(page_numbers):
+                pending = [number for number in page_numbers if number not in results]
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                try:
+                    pickle.dump((data, pending), self._process.stdin)
+                    self._process.stdin.flush()
+                except OSError as e:
+                    self.kill()
+                    raise RuntimeError("OCR process exited") from e
+                for number in pending:
+                    results[number] = self._receive(timeout)
+                    if self._process is None:
+                        # Killed: a new process takes the remaining pages
+                        break
+        return results
+
+
+_ocr_process = None
+
+
+def ocr_process() -> OCRProcess:
+    """The OCR child process of this process."""
+    global _ocr_process
+    if _ocr_process is None:
+        _ocr_process = OCRProcess()
+    return _ocr_process
@@ -1,19 +1,95 @@
 from queue import Full
 import re
 from tokenize import Name
+from typing import AsyncIterator, Iterator, Union
 from langchain import hub
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda, RunnableMap
 from langchain_core.prompts import PromptTemplate
 
 
+class AnswerStream:
+    """
+    Incremental `Str_OutputParser.extract_answer`: fed with streamed chunks,
+    returns the text that can be emitted so far. The "Answer:" marker is
+    looked for in the first `preamble_chars` characters only; within that
+    window the output is the same as parsing the whole text at once.
+    """
+    MARKER = "Answer:"
+
+    def __init__(self, preamble_chars: int = 24) -> None:
+        self.preamble_chars = preamble_chars
+        self.buffer = ""
+        self.mode = "preamble"  # -> "answer" (marker found) or "passthrough"
+        self.started = False
+        self.trailing = ""
+
+    def _answer(self, text: str) -> str:
+        # The answer is stripped: drop leading whitespace, hold back trailing whitespace
+        text = self.trailing + text
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        body = text.rstrip()
+        self.trailing = text[len(body):]
+        return body
+
+    def feed(self, text: str) -> str:
+        if self.mode == "answer":
+            return self._answer(text)
+        if self.mode == "passthrough":
+            return text
+        self.buffer += text
+        position = self.buffer.find(self.MARKER)
+        if position != -1:
+            self.mode = "answer"
+            return self._answer(self.buffer[position + len(self.MARKER):])
+        if len(self.buffer) >= self.preamble_chars:
+            self.mode = "passthrough"
+            return self.buffer
+        return ""
+
+    def end(self) -> str:
+        return self.buffer if self.mode == "preamble" else ""
+
+
+def _chunk_text(chunk: Union[str, BaseMessage]) -> str:
+    return ChatGeneration(message=chunk).text if isinstance(chunk, BaseMessage) else chunk
+
+
 class Str_OutputParser(StrOutputParser):
+    # While streaming, "Answer:" is only looked for in this many leading characters:
+    # the marker opens the answer, and a longer window would delay the first token
+    preamble_chars: int = 24
+
     def __init__(self) -> None:
         super().__init__()
     
     def parse(self, text: str) -> str:
         return self.extract_answer(text)
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[str]:
+        stream = AnswerStream(self.preamble_chars)
+        for chunk in input:
+            text = stream.feed(_chunk_text(chunk))
+            if text:
+                yield text
+        text = stream.end()
+        if text:
+            yield text
+
+    async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[str]:
+        stream = AnswerStream(self.preamble_chars)
+        async for chunk in input:
+            text = stream.feed(_chunk_text(chunk))
+            if text:
+                yield text
+        text = stream.end()
+        if text:
+            yield text
     
     
     def extract_answer(self,
@@ -0,0 +1,201 @@
+import queue
+import threading
+from collections import deque
+from typing import Iterator, List, Tuple
+
+from tqdm import tqdm
+
+from src.base.metrics import timed
+from src.rag.worker_pool import WorkerPool
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion: parse (the loader's WorkerPool) -> chunk -> embed, each stage in
+    its own thread, joined by bounded queues. A slow stage fills its input
+    queue and blocks the stages before it, so at most `queue_size` files per
+    stage (plus the parse window) are in memory whatever the corpus size,
+    while the embedder works on one batch as the next PDFs parse.
+
+    `run` yields (source, chunks, vectors) per file, in input order; the
+    caller indexes them (see CandidateDB.stream_sync). `progress` counts the
+    work done by each stage. A file that fails to parse is reported, counted
+    as `failed` and skipped; it is not recorded as indexed, so the next sync
+    tries it again.
+    """
+    STAGES = ("parsed", "chunked", "embedded", "indexed", "failed")
+
+    def __init__(self, loader, embedding, workers: int = 1, queue_size: int = 8,
+                 embed_batch: int = 256, show_progress: bool = True) -> None:
+        self.loader = loader
+        self.embedding = embedding
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.embed_batch = embed_batch
+        self.show_progress = show_progress
+        self.progress = dict.fromkeys(self.STAGES, 0)
+        self._stop = threading.Event()
+        self._bars = {}
+
+    def _put(self, q: queue.Queue, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _advance(self, stage: str, n: int = 1):
+        self.progress[stage] += n
+        if stage in self._bars:
+            self._bars[stage].update(n)
+
+    def _stage(self, target, inbox, outbox):
+        def run():
+            try:
+                target(inbox, outbox)
+            except BaseException as e:
+                self._put(outbox, _Failed(e))
+                return
+            self._put(outbox, _DONE)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _parse(self, sources, outbox):
+        pool = self.loader.pool
+        if pool is not None:
+            return self._parse_with(pool, sources, outbox)
+        # No shared pool: one for this run only
+        pool = WorkerPool(processes=min(self.workers, len(sources)), context=None)
+        if not pool.runs_inline(len(sources), self.workers):
+            pool.start()
+        try:
+            return self._parse_with(pool, sources, outbox)
+        finally:
+            pool.stop()
+
+    def _parse_with(self, pool: WorkerPool, sources, outbox):
+        load_file = self.loader.doc_loader.load_file
+        inline = pool.runs_inline(len(sources), self.workers)
+        # At most `workers` files in flight, even on a larger shared pool
+        window = 1 if inline else self.workers
+        pending = deque()
+        for source in sources:
+            pending.append((source, pool.apply_async(load_file, (source,), inline=inline)))
+            if len(pending) >= window and not self._forward(*pending.popleft(), outbox):
+                return
+        while pending:
+            if not self._forward(*pending.popleft(), outbox):
+                return
+
+    def _forward(self, source, result, outbox) -> bool:
+        """Pass a parsed file on; False once the pipeline is stopping."""
+        try:
+            _, pages, error = result.get()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error is not None:
+            print(f"Skipping {source}: {error}")
+            self._advance("failed")
+            return not self._stop.is_set()
+        if not self._put(outbox, (source, pages)):
+            return False
+        self._advance("parsed")
+        return True
+
+    def _chunk(self, inbox, outbox):
+        while True:
+            item = self._get(inbox)
+            if item is _DONE or isinstance(item, _Failed):
+                if isinstance(item, _Failed):
+                    raise item.error
+                return
+            source, pages = item
+            chunks = self.loader.doc_spltter(pages)
+            if not self._put(outbox, (source, chunks)):
+                return
+            self._advance("chunked", len(chunks))
+
+    def _embed(self, inbox, outbox):
+        done = False
+        while not done:
+            item = self._get(inbox)
+            batch = []
+            # Group whole files until the batch is big enough or the queue runs dry
+            while True:
+                if item is _DONE:
+                    done = True
+                    break
+                if isinstance(item, _Failed):
+                    raise item.error
+                batch.append(item)
+                if sum(len(chunks) for _, chunks in batch) >= self.embed_batch:
+                    break
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+            texts = [chunk.page_content for _, chunks in batch for chunk in chunks]
+            vectors = []
+            if texts:
+                with timed("embed", items=len(texts)):
+                    vectors = self.embedding.embed_documents(texts)
+            start = 0
+            for source, chunks in batch:
+                if not self._put(outbox, (source, chunks, vectors[start:start + len(chunks)])):
+                    return
+                start += len(chunks)
+            self._advance("embedded", len(texts))
+
+    def run(self, sources: List[str]) -> Iterator[Tuple[str, list, list]]:
+        if not sources:
+            return
+        self._stop.clear()
+        if self.show_progress:
+            self._bars = {
+                "parsed": tqdm(total=len(sources), desc="Parsing", unit="file", position=0),
+                "chunked": tqdm(desc="Chunking", unit="chunk", position=1),
+                "embedded": tqdm(desc="Embedding", unit="chunk", position=2),
+            }
+        parsed = queue.Queue(self.queue_size)
+        chunked = queue.Queue(self.queue_size)
+        embedded = queue.Queue(self.queue_size)
+        threads = [
+            self._stage(lambda _, outbox: self._parse(sources, outbox), None, parsed),
+            self._stage(self._chunk, parsed, chunked),
+            self._stage(self._embed, chunked, embedded),
+        ]
+        try:
+            while True:
+                item = self._get(embedded)
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failed):
+                    raise item.error
+                yield item
+                self._advance("indexed", len(item[1]))
+        finally:
+            # Also reached when the consumer stops early: unblock every stage
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            for bar in self._bars.values():
+                bar.close()
+            self._bars = {}
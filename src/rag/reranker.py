@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import List
+
+from sentence_transformers import CrossEncoder
+
+from src.base.metrics import timed
+from src.rag.embeddings import shared_model
+
+DEFAULT_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """
+    Re-ranks the top `top_n` retrieved chunks with a CPU cross-encoder, within
+    a latency budget: chunks are scored in batches sized from the measured
+    time per pair to fit the remaining `budget` seconds; once no pair fits,
+    the rest keeps its retrieval order (after the scored ones).
+    """
+    def __init__(self, model_name: str = DEFAULT_MODEL, top_n: int = 20, budget: float = 0.15,
+                 batch_size: int = 8, device: str = "cpu") -> None:
+        self.model_name = model_name
+        self.top_n = top_n
+        self.budget = budget
+        self.batch_size = batch_size
+        self.device = device
+        self.seconds_per_pair = None  # running estimate, set by `load` or the first batch
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> CrossEncoder:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = shared_model(CrossEncoder, self.model_name, self.device)
+        return self._model
+
+    def load(self):
+        """Load the model and time it ahead of the first query."""
+        self._predict("warm up", ["warm up " * 64] * self.batch_size)
+
+    def _predict(self, query: str, texts: List[str]):
+        start = time.perf_counter()
+        scores = self.model.predict([(query, text) for text in texts],
+                                    batch_size=self.batch_size, show_progress_bar=False)
+        per_pair = (time.perf_counter() - start) / len(texts)
+        self.seconds_per_pair = per_pair if self.seconds_per_pair is None \
+            else 0.8 * self.seconds_per_pair + 0.2 * per_pair
+        return scores
+
+    def rerank(self, query: str, docs: List) -> List:
+        head, tail = docs[:self.top_n], docs[self.top_n:]
+        deadline = time.perf_counter() + self.budget
+        scored = []
+        with timed("rerank") as timer:
+            while len(scored) < len(head):
+                size = min(self.batch_size, len(head) - len(scored))
+                if self.seconds_per_pair is not None:
+                    size = min(size, int((deadline - time.perf_counter()) / self.seconds_per_pair))
+                if size < 1:
+                    break
+                batch = head[len(scored):len(scored) + size]
+                scores = self._predict(query, [doc.page_content for doc in batch])
+                scored.extend(zip(scores, batch))
+            timer.items = len(scored)
+        reranked = [doc for _, doc in sorted(scored, key=lambda pair: -pair[0])]
+        return reranked + head[len(scored):] + tail
@@ -0,0 +1,53 @@
+import os
+import zipfile
+from typing import List, Tuple
+
+from src.rag.manifest import file_hash
+
+# "<archive>.zip!/<member>" names a file inside a ZIP archive, read without extracting it
+ZIP_SEP = "!/"
+
+
+def zip_member(archive: str, member: str) -> str:
+    return f"{archive}{ZIP_SEP}{member}"
+
+
+def split_zip_member(source: str) -> Tuple[str, str]:
+    """(archive, member) of a ZIP member source, (None, None) for anything else."""
+    archive, sep, member = source.partition(ZIP_SEP)
+    if sep and member and archive.lower().endswith(".zip"):
+        return archive, member
+    return None, None
+
+
+def zip_members(archive: str, suffix: str = ".pdf") -> List[str]:
+    """Sources of the `suffix` files inside a ZIP archive."""
+    with zipfile.ZipFile(archive) as zf:
+        return [zip_member(archive, info.filename) for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(suffix)
+                and not os.path.basename(info.filename).startswith(".")]
+
+
+def is_local_source(source: str) -> bool:
+    """A local file, or a member of a local ZIP archive."""
+    archive, _ = split_zip_member(source)
+    return os.path.isfile(archive or source)
+
+
+def read_source(source: str) -> bytes:
+    archive, member = split_zip_member(source)
+    if archive is None:
+        with open(source, "rb") as f:
+            return f.read()
+    with zipfile.ZipFile(archive) as zf:
+        return zf.read(member)
+
+
+def source_hash(source: str) -> str:
+    """Content hash of a local source; ZIP members use their CRC and size from the archive index."""
+    archive, member = split_zip_member(source)
+    if archive is None:
+        return file_hash(source)
+    with zipfile.ZipFile(archive) as zf:
+        info = zf.getinfo(member)
+    return f"zip:{info.CRC:08x}:{info.file_size}"
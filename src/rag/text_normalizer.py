@@ -0,0 +1,97 @@
+import re
+import unicodedata
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+# Ligatures left by PDF text extraction; NFKC folds them too, this table
+# covers policies without compatibility normalization
+LIGATURES = {
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi",
+    "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st", "\u0132": "IJ", "\u0133": "ij",
+}
+LIGATURE = re.compile("[\ufb00-\ufb06\u0132\u0133]")
+# Control characters (except newline/carriage return) become nothing, odd
+# spaces become " ", Unicode line separators become "\n"
+SPECIAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xa0\xad\u1680\u2000-\u200f"
+                     "\u2028\u2029\u202f\u205f\u2060\u3000\ufeff\t]")
+SPACES = frozenset("\t\x0b\x0c\xa0\u1680\u202f\u205f\u3000") | frozenset(map(chr, range(0x2000, 0x200b)))
+ASCII_CONTROLS = bytes(range(0x00, 0x09)) + bytes(range(0x0e, 0x20)) + b"\x7f"
+ASCII_SPACES = bytes.maketrans(b"\t\x0b\x0c", b"   ")
+MULTI_SPACE = re.compile("  +")
+BLANK_LINES = re.compile("\n\n\n+")
+
+
+@dataclass(frozen=True)
+class NormalizationPolicy:
+    """
+    How extracted page text is cleaned before chunking.
+    - unicode_form: "NFKC" (default) folds compatibility characters (full-width
+      letters, ligatures, non-breaking spaces); "NFC" only composes accents;
+      None keeps the text as extracted.
+    - fix_ligatures: expand ligatures (ﬁ -> fi) when unicode_form does not.
+    - strip_invisible: drop control, zero-width and soft-hyphen characters.
+    - collapse_whitespace: runs of spaces/tabs become one space, at most one
+      blank line in a row.
+    - ascii_only: the old lossy behaviour, drops every non-ASCII character.
+    """
+    unicode_form: Optional[str] = "NFKC"
+    fix_ligatures: bool = True
+    strip_invisible: bool = True
+    collapse_whitespace: bool = True
+    ascii_only: bool = False
+
+    def params(self) -> dict:
+        return asdict(self)
+
+
+DEFAULT_POLICY = NormalizationPolicy()
+
+
+def _special(policy: "NormalizationPolicy"):
+    def replace(match):
+        char = match.group()
+        if char in SPACES:
+            return " " if policy.collapse_whitespace else char
+        if char in "\u2028\u2029":
+            return "\n" if policy.collapse_whitespace else char
+        return "" if policy.strip_invisible else char
+    return replace
+
+
+def normalize_text(text: str, policy: NormalizationPolicy = DEFAULT_POLICY) -> str:
+    """
+    Normalize a page of extracted text. Every step is a C-level scan (str and
+    bytes methods, unicodedata, regexes whose matches are rare) and steps
+    that would change nothing are skipped.
+    """
+    if text.isascii():
+        if policy.strip_invisible or policy.collapse_whitespace:
+            text = text.encode("ascii").translate(
+                ASCII_SPACES if policy.collapse_whitespace else None,
+                ASCII_CONTROLS if policy.strip_invisible else b"",
+            ).decode("ascii")
+    else:
+        if policy.unicode_form and not unicodedata.is_normalized(policy.unicode_form, text):
+            # Only the lines that need it: normalizing is costly, the quick check is not
+            form = policy.unicode_form
+            text = "\n".join([line if unicodedata.is_normalized(form, line) else unicodedata.normalize(form, line)
+                               for line in text.split("\n")])
+        if policy.fix_ligatures and policy.unicode_form not in ("NFKC", "NFKD"):
+            text = LIGATURE.sub(lambda match: LIGATURES[match.group()], text)
+        if policy.ascii_only:
+            text = text.encode("ascii", "ignore").decode("ascii")
+        if policy.strip_invisible or policy.collapse_whitespace:
+            text = SPECIAL.sub(_special(policy), text)
+    if policy.collapse_whitespace:
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if "  " in text:
+            text = MULTI_SPACE.sub(" ", text)
+        if " \n" in text:
+            text = text.replace(" \n", "\n")
+        if "\n " in text:
+            text = text.replace("\n ", "\n")
+        if "\n\n\n" in text:
+            text = BLANK_LINES.sub("\n\n", text)
+        text = text.strip()
+    return text
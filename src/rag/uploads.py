@@ -0,0 +1,44 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Tuple
+
+CHUNK_SIZE = 1 << 20
+PDF_SIGNATURE = b"%PDF-"
+# PDF readers accept the header anywhere in the first KiB
+PDF_HEADER_WINDOW = 1024
+
+
+def store_upload(file: BinaryIO, upload_dir: str, filename: str) -> Tuple[str, str, bool]:
+    """
+    Copy an uploaded PDF into `upload_dir` chunk by chunk, hashing it on the
+    way, and store it under its content hash (`<sha256>.pdf`): the same CV
+    uploaded twice, under any name, maps to the same file, and different
+    CVs with the same name no longer overwrite each other.
+    The content must carry a PDF header: anything else raises ValueError
+    and leaves nothing in `upload_dir`, which is indexed as the corpus.
+    Blocking, run it in a thread. Returns (path, sha256, whether it is new).
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    head = b""
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                if len(head) < PDF_HEADER_WINDOW:
+                    head += chunk[:PDF_HEADER_WINDOW - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+        if PDF_SIGNATURE not in head:
+            raise ValueError(f"{filename or 'The upload'} is not a PDF file")
+        path = os.path.join(upload_dir, f"{digest.hexdigest()}.pdf")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return path, digest.hexdigest(), False
+        os.replace(tmp_path, path)
+        return path, digest.hexdigest(), True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
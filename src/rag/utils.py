@@ -1,4 +1,5 @@
 import re
+import json
 
 def extract_answer(text_response: str,
                    pattern: str = r"Answer:\s*(.*)"
@@ -12,3 +13,48 @@ def extract_answer(text_response: str,
         return "Answer not found."
 
 
+def parse_json(text: str):
+    """Parse the JSON object of an LLM answer, with or without ```json fences."""
+    json_str = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.MULTILINE)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r"\{.*\}", json_str, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_records(records: list) -> dict:
+    """
+    Merge partial JSON records extracted from sections of the same CV:
+    lists are concatenated without duplicates, nested objects are merged
+    recursively and for scalar fields the first non-empty value wins.
+    """
+    merged = {}
+    for record in records:
+        for key, value in record.items():
+            if _is_empty(value):
+                merged.setdefault(key, value)
+                continue
+            current = merged.get(key)
+            if _is_empty(current):
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(current, list):
+                values = value if isinstance(value, list) else [value]
+                seen = {json.dumps(v, sort_keys=True) for v in current}
+                for v in values:
+                    if json.dumps(v, sort_keys=True) not in seen:
+                        current.append(v)
+                        seen.add(json.dumps(v, sort_keys=True))
+            elif isinstance(current, dict) and isinstance(value, dict):
+                merged[key] = merge_records([current, value])
+    return merged
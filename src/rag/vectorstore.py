@@ -1,41 +1,663 @@
+import logging
 import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, List
+import faiss
+import numpy as np
+from cachetools import TTLCache
 from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnableLambda
+from src.rag.manifest import IngestManifest, source_key
+from src.rag.sources import is_local_source, source_hash
+from src.rag.chunk_store import ChunkStore, save_store, load_store
+from src.rag.pipeline import IngestPipeline
+from src.rag.embeddings import CachedEmbeddings, normalize_query
+from src.rag.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from src.base.metrics import QUERY_CACHE, timed
+from src.rag.ann_index import (IndexConfig, create_index, apply_search_defaults,
+                               search_params, supports_remove, needs_retrain)
+
+
+logger = logging.getLogger(__name__)
+
+# Filtered HNSW searches score up to this many chunks exactly instead of walking the graph
+EXACT_SCAN_MAX = 20000
+
+
+@dataclass
+class PendingUpdate:
+    """An index change already loaded and embedded, waiting to be committed."""
+    docs: list
+    vectors: list
+    changed: Dict[str, str] = field(default_factory=dict)  # path -> content hash
+    removed: List[str] = field(default_factory=list)
+    stale_ids: List[str] = field(default_factory=list)
+    rebuild: bool = False
+    ids: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # source -> parse error
+
+
+class _ReadWriteLock:
+    """Shared for readers, exclusive for the writer; a waiting writer holds off new readers."""
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
 
 class CandidateDB:
-    def __init__(self, persist_dir: str = "./vectorstore", embedding_model=None):
-        self.embedding = embedding_model or HuggingFaceEmbeddings()
+    """
+    FAISS store of CV chunks. Writes must come from a single writer (see
+    IndexManager). New chunks are appended to the live index, which leaves
+    the positions of existing ones alone: searches hold a shared lock that
+    the append takes exclusively for the few milliseconds it lasts, so they
+    never see a half-applied update and a commit costs the same at any index
+    size. Deletes shift positions, so a commit that deletes is applied to a
+    copy which then replaces the reference.
+
+    On disk, each flush writes the index and its manifest to a new
+    `gen-*` directory and then atomically repoints `CURRENT` to it.
+    `commit` only marks the snapshot dirty; the convenience methods
+    (build_db, add_documents, delete, sync) flush right away while
+    IndexManager flushes in the background.
+
+    The FAISS index type (flat, IVF-Flat, IVF-PQ, HNSW) is set by `index_config`.
+    Chunks are kept in a memory-mapped ChunkStore rather than a pickled docstore.
+
+    With `lexical`, a BM25 index of the chunks is maintained alongside each
+    snapshot and `search` fuses its ranking with the vector ranking
+    (reciprocal rank fusion over the top `fetch_k` of each); a `reranker`
+    then re-orders the fused top hits.
+
+    `on_remove`, if given, is called with the sources a commit removed from
+    the index (e.g. to drop their extracted profiles).
+
+    Search results are cached by (normalized query, search arguments,
+    `version`); `version` is incremented by every commit that changes the
+    index, so an upload is visible to the next search.
+
+    With `read_only`, the store serves the generations written by a writer in
+    another process: the FAISS vectors and chunks are memory-mapped (shared by
+    every process reading the same generation) and `refresh` switches to the
+    generation `CURRENT` points to once it changes.
+    """
+    def __init__(self, persist_dir: str = "./vectorstore", embedding_model=None,
+                 keep_generations: int = 2, index_config: IndexConfig = None,
+                 lexical: bool = True, reranker=None, fetch_k: int = 20,
+                 result_cache_size: int = 2048, result_cache_ttl: float = 600,
+                 read_only: bool = False, on_remove=None):
+        self.embedding = embedding_model or CachedEmbeddings()
+        self.index_config = index_config or IndexConfig()
         self.persist_dir = persist_dir
+        self.keep_generations = keep_generations
+        self.use_lexical = lexical
+        self.reranker = reranker
+        self.fetch_k = fetch_k
+        self.read_only = read_only
+        self.on_remove = on_remove
+        self.generation = None  # directory of the loaded generation
+        self.manifest = None
         self.db = None
+        self.lexical = None
+        self.version = 0
+        self._results = TTLCache(maxsize=result_cache_size, ttl=result_cache_ttl)
+        self._results_lock = threading.Lock()
+        self.dirty = 0
+        self.ingest_progress = None
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._position_map = None
+        self._flush_lock = threading.Lock()
+        self._snapshot_lock = _ReadWriteLock()
+
+    @property
+    def embedding_name(self):
+        return getattr(self.embedding, "model_name", type(self.embedding).__name__)
 
     def build_db(self, docs):
-        self.db = FAISS.from_documents(docs, self.embedding)
-        self.db.save_local(self.persist_dir)
+        update = self._embed(docs)
+        update.rebuild = True
+        self.commit([update])
+        self.flush()
+        return update.ids
+
+    def current_dir(self):
+        """Directory of the current index generation (the legacy flat layout if none)."""
+        pointer = os.path.join(self.persist_dir, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer, "r", encoding="utf-8") as f:
+                return os.path.join(self.persist_dir, f.read().strip())
+        return self.persist_dir
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.current_dir(), "manifest.json")
+
+    def index_exists(self):
+        return os.path.exists(os.path.join(self.current_dir(), "index.faiss"))
+
+    def load_db(self):
+        if self.db is None and self.index_exists():
+            if self.read_only:
+                self.refresh()
+                return self.db
+            current = self.current_dir()
+            with timed("faiss_load"):
+                db = load_store(current, self.embedding)
+            apply_search_defaults(db.index, self.index_config)
+            if self.use_lexical:
+                self.lexical = self._load_lexical(db, current)
+            self.generation = current
+            self.db = db
+        return self.db
+
+    def refresh(self) -> bool:
+        """
+        Read-only mode: load the generation `CURRENT` points to, if it is not
+        the one being served, and swap it in. Returns whether it did.
+        """
+        current = self.current_dir()
+        if current == self.generation or not os.path.exists(os.path.join(current, "index.faiss")):
+            return False
+        with timed("faiss_load"):
+            db = load_store(current, self.embedding, mmap_index=True)
+        apply_search_defaults(db.index, self.index_config)
+        lexical = self._load_lexical(db, current) if self.use_lexical else None
+        manifest = IngestManifest(os.path.join(current, "manifest.json"))
+        self.lexical, self.manifest, self.db = lexical, manifest, db
+        self.generation = current
+        self.version += 1
+        return True
+
+    def _load_lexical(self, db: FAISS, path: str) -> LexicalIndex:
+        lexical = LexicalIndex.load(path)
+        if lexical is None:
+            # Generation written before the lexical index existed: build it once from the chunks
+            with timed("lexical_build", items=db.index.ntotal):
+                ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+                lexical = LexicalIndex.build(ids, [db.docstore.search(id_).page_content for id_ in ids])
+        return lexical
+
+    def flush(self) -> bool:
+        """
+        Persist the latest committed snapshot, if any. The index and manifest
+        are written to a fresh generation directory, then `CURRENT` is
+        replaced atomically, so a crash never leaves a half-written index.
+        Commits that append in place wait for the flush to finish.
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending, self.dirty = self._pending, None, 0
+            if pending is None:
+                return False
+            db, lexical, params, files = pending
+            gen = f"gen-{time.time_ns()}"
+            tmp_dir = os.path.join(self.persist_dir, f".{gen}.tmp")
+            os.makedirs(tmp_dir)
+            if db is not None:
+                with timed("faiss_save", items=db.index.ntotal):
+                    save_store(db, tmp_dir)
+            if lexical is not None:
+                with timed("lexical_save", items=len(lexical)):
+                    lexical.save(tmp_dir)
+            if params is not None:
+                IngestManifest.write(os.path.join(tmp_dir, "manifest.json"), params, files)
+            os.rename(tmp_dir, os.path.join(self.persist_dir, gen))
+            pointer = os.path.join(self.persist_dir, "CURRENT")
+            with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+                f.write(gen)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{pointer}.tmp", pointer)
+            self._prune_generations()
+            return True
+
+    def _prune_generations(self):
+        gens = sorted(name for name in os.listdir(self.persist_dir) if name.startswith("gen-"))
+        for name in gens[:-self.keep_generations]:
+            shutil.rmtree(os.path.join(self.persist_dir, name), ignore_errors=True)
 
     def add_documents(self, docs):
-        if self.db is None:
-            if os.path.exists(self.persist_dir):
-                self.db = FAISS.load_local(self.persist_dir, self.embedding, allow_dangerous_deserialization=True)
-            else:
-                self.db = FAISS.from_documents(docs, self.embedding)
-                self.db.save_local(self.persist_dir)
-                return
-        self.db.add_documents(docs)
-        self.db.save_local(self.persist_dir)
-
-    def search(self, query, k=3):
-        if self.db is None:
-            if os.path.exists(self.persist_dir):
-                self.db = FAISS.load_local(self.persist_dir, self.embedding, allow_dangerous_deserialization=True)
-
-            else:
-                raise ValueError("Database has not been built. Call build_db() with documents first.")
-        return self.db.similarity_search(query, k=k)
+        if not docs:
+            return []
+        update = self._embed(docs)
+        self.commit([update])
+        self.flush()
+        return update.ids
+
+    def delete(self, ids):
+        if ids:
+            self.commit([PendingUpdate(docs=[], vectors=[], stale_ids=list(ids))])
+            self.flush()
+
+    def _embed(self, docs) -> PendingUpdate:
+        if not docs:
+            return PendingUpdate(docs=docs, vectors=[])
+        with timed("embed", items=len(docs)):
+            vectors = self.embedding.embed_documents([doc.page_content for doc in docs])
+        return PendingUpdate(docs=docs, vectors=vectors)
+
+    def _manifest(self, loader) -> IngestManifest:
+        params = {
+            "file_type": loader.file_type,
+            "split_kwargs": loader.split_kwargs,
+            "normalization": loader.normalization.params(),
+            "embedding_model": self.embedding_name,
+            "normalize_embeddings": getattr(self.embedding, "normalize", False),
+            "index": self.index_config.build_params(),
+        }
+        if self.manifest is None or self.manifest.params != params:
+            self.manifest = IngestManifest(self.manifest_path, params)
+        return self.manifest
+
+    def _diff(self, files, loader, prune: bool):
+        """
+        Compare `files` with the ingestion manifest.
+        Returns (update without documents, sources to load).
+        """
+        manifest = self._manifest(loader)
+        # A manifest written with other settings (or no manifest at all) means
+        # the stored vectors cannot be trusted: rebuild from the full corpus.
+        rebuild = not manifest.compatible and prune
+        if not manifest.compatible:
+            manifest.reset()
+
+        # ZIP members count as local files: they are tracked by their CRC and size
+        local_files = [f for f in files if is_local_source(f)]
+        remote_sources = [f for f in files if not is_local_source(f)]
+        changed, removed = manifest.diff(local_files, prune=prune, hasher=source_hash)
+        if changed or removed:
+            logger.info("Index sync: %d new/changed, %d removed, %d unchanged",
+                        len(changed), len(removed), len(local_files) - len(changed))
+        update = PendingUpdate(docs=[], vectors=[], changed=changed, removed=removed, rebuild=rebuild)
+        return update, list(changed) + remote_sources
+
+    def prepare(self, files, loader, workers: int = 1, prune: bool = False) -> PendingUpdate:
+        """
+        Compare `files` with the ingestion manifest, then parse, chunk and embed
+        only new or changed files. With `prune`, `files` is the full corpus and
+        vectors of files no longer present are scheduled for deletion. Sources
+        that are not local files (e.g. links) are always loaded. Files that
+        fail to parse are left out (see `failed`) and not recorded in the
+        manifest, so the next sync tries them again.
+        Nothing is written until the update is committed.
+        """
+        update, to_load = self._diff(files, loader, prune)
+        docs = loader.load(to_load, workers=workers, errors=update.failed) if to_load else []
+        for source in update.failed:
+            update.changed.pop(source_key(source), None)
+        update.docs, update.vectors = docs, self._embed(docs).vectors
+        return update
+
+    def stream_sync(self, files, loader, workers: int = 1, prune: bool = False,
+                    commit_every: int = 4096, on_commit=None) -> int:
+        """
+        Like `sync`, for large corpora: files stream through an IngestPipeline
+        and are committed every `commit_every` chunks, so memory does not grow
+        with the corpus and searches see files as soon as their batch is in.
+        The manifest is updated per batch, so an interrupted sync resumes
+        where the last flush left off. Returns the number of new chunks.
+        """
+        update, to_load = self._diff(files, loader, prune)
+        changed, rebuild, total = update.changed, update.rebuild, 0
+        batch = PendingUpdate(docs=[], vectors=[], removed=update.removed, rebuild=rebuild)
+        pipeline = IngestPipeline(loader, self.embedding, workers=workers)
+        self.ingest_progress = pipeline.progress
+        for source, docs, vectors in pipeline.run(to_load):
+            key = source_key(source)
+            if key in changed:
+                batch.changed[key] = changed[key]
+            batch.docs.extend(docs)
+            batch.vectors.extend(vectors)
+            if len(batch.docs) >= commit_every:
+                self.commit([batch])
+                total += len(batch.docs)
+                # A rebuild starts a new store with the first batch that has chunks
+                rebuild = rebuild and not batch.docs
+                if on_commit is not None:
+                    on_commit()
+                batch = PendingUpdate(docs=[], vectors=[], rebuild=rebuild)
+        self.commit([batch])
+        total += len(batch.docs)
+        if on_commit is not None:
+            on_commit()
+        return total
+
+    def _new_store(self, texts, vectors, metadatas, ids) -> FAISS:
+        index = create_index(self.index_config, np.asarray(vectors, dtype=np.float32))
+        db = FAISS(self.embedding, index, ChunkStore(), {})
+        db.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        return db
+
+    def _empty_store(self, dim: int) -> FAISS:
+        # Served (and saved) in place of an index whose chunks were all deleted
+        index = create_index(self.index_config, np.empty((0, dim), dtype=np.float32))
+        return FAISS(self.embedding, index, ChunkStore(), {})
+
+    def _rebuild_store(self, db: FAISS, exclude=()) -> FAISS:
+        """
+        Build a fresh index (re-trained for IVF) from the documents of `db`,
+        minus `exclude`. Vectors come from the embedding cache, not the model.
+        """
+        exclude = set(exclude)
+        ids = [id_ for _, id_ in sorted(db.index_to_docstore_id.items()) if id_ not in exclude]
+        docs = [db.docstore.search(id_) for id_ in ids]
+        if not docs:
+            return self._empty_store(db.index.d)
+        texts = [doc.page_content for doc in docs]
+        vectors = self.embedding.embed_documents(texts)
+        return self._new_store(texts, vectors, [doc.metadata for doc in docs], ids)
+
+    def _copy(self, db: FAISS) -> FAISS:
+        return FAISS(
+            self.embedding,
+            faiss.clone_index(db.index),
+            db.docstore.copy(),
+            dict(db.index_to_docstore_id),
+        )
+
+    def commit(self, updates: List[PendingUpdate]):
+        """
+        Apply prepared updates: chunks are appended to the live index, unless
+        the update deletes some, in which case it goes to a copy that is
+        swapped in.
+        """
+        if self.read_only:
+            raise RuntimeError("This index is read-only: writes go through the index writer")
+        manifest = self.manifest
+        rebuild = any(update.rebuild for update in updates)
+        # Within a batch, the last update of a file supersedes earlier ones
+        latest = {}
+        for n, update in enumerate(updates):
+            for path in update.changed:
+                latest[path] = n
+
+        stale_ids, texts, vectors, metadatas, ids = [], [], [], [], []
+        ids_by_source = defaultdict(list)
+        for n, update in enumerate(updates):
+            stale_ids.extend(update.stale_ids)
+            if manifest is not None:
+                for path in list(update.removed) + list(update.changed):
+                    stale_ids.extend(manifest.forget(path))
+            update.ids = [str(uuid.uuid4()) for _ in update.docs]
+            for doc, vector, id_ in zip(update.docs, update.vectors, update.ids):
+                key = source_key(doc.metadata.get("source", ""))
+                if latest.get(key, n) != n:
+                    continue
+                texts.append(doc.page_content)
+                vectors.append(vector)
+                metadatas.append(doc.metadata)
+                ids.append(id_)
+                ids_by_source[key].append(id_)
+
+        current = None if rebuild else self.load_db()
+        if current is not None:
+            positions = self._positions(current)
+            stale_ids = [id_ for id_ in stale_ids if id_ in positions]
+        if not (rebuild or texts or stale_ids or any(update.changed or update.removed for update in updates)):
+            # Nothing to apply: keep the version (and the cached results) and write no generation
+            return
+        in_place = current is not None and not stale_ids and bool(texts)
+        # A flush must not save the live index halfway between an append and its manifest
+        with self._flush_lock if in_place else nullcontext():
+            new_db, new_lexical = self._apply(current, stale_ids, texts, vectors, metadatas, ids)
+            self.lexical = new_lexical
+            self.db = new_db
+            # After the swap: a result cached under the old version may be newer, never older
+            self.version += 1
+            if manifest is not None:
+                for n, update in enumerate(updates):
+                    for path, digest in update.changed.items():
+                        if latest[path] == n:
+                            manifest.record(path, digest, ids_by_source.get(path, []))
+                manifest.compatible = True
+            # Hand the snapshot over to the next flush
+            with self._pending_lock:
+                self._pending = (self.db,
+                                 self.lexical,
+                                 manifest.params if manifest is not None else None,
+                                 manifest.snapshot() if manifest is not None else None)
+                self.dirty += len(texts) + len(stale_ids) or 1
+        removed = [path for update in updates for path in update.removed]
+        if removed and self.on_remove is not None:
+            self.on_remove(removed)
+
+    def _apply(self, current, stale_ids, texts, vectors, metadatas, ids):
+        """
+        The index and lexical index with the changes applied. An index left
+        without chunks is an empty store, not None, so the previous generation
+        is not loaded again; None only when there never was one.
+        """
+        new_lexical = None
+        if current is None:
+            new_db = None
+            if texts:
+                with timed("faiss_build", items=len(texts)):
+                    new_db = self._new_store(texts, vectors, metadatas, ids)
+            elif self.db is not None:
+                # Rebuilt from an empty corpus
+                new_db = self._empty_store(self.db.index.d)
+            if new_db is not None and self.use_lexical:
+                with timed("lexical_add", items=len(texts)):
+                    new_lexical = LexicalIndex.build(ids, texts)
+            return new_db, new_lexical
+
+        new_db = current
+        removable = supports_remove(current.index)
+        if stale_ids:
+            with timed("faiss_copy"):
+                new_db = self._copy(current)
+            if removable:
+                with timed("faiss_delete", items=len(stale_ids)):
+                    new_db.delete(stale_ids)
+        if texts:
+            with timed("faiss_add", items=len(texts)), \
+                    self._snapshot_lock.write() if new_db is current else nullcontext():
+                new_db.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        if (stale_ids and not removable) or needs_retrain(new_db.index, self.index_config):
+            # HNSW and IVF cannot remove vectors in place; IVF outgrew its centroids
+            with timed("faiss_rebuild"):
+                new_db = self._rebuild_store(new_db, exclude=stale_ids if not removable else ())
+        if self.lexical is not None:
+            with timed("lexical_add", items=len(texts)):
+                new_lexical = self.lexical.copy()
+                new_lexical.delete(stale_ids)
+                new_lexical.add(ids, texts)
+        return new_db, new_lexical
+
+    def sync(self, files, loader, workers: int = 1, prune: bool = False):
+        """Prepare and commit an index update for `files`, see `prepare`. Returns the new chunks."""
+        update = self.prepare(files, loader, workers=workers, prune=prune)
+        self.commit([update])
+        self.flush()
+        return update.docs
+
+    def _cached(self, key: tuple, search):
+        """Result of `search()`, cached under `key` for the current index version."""
+        key = (self.version,) + key
+        with self._results_lock:
+            result = self._results.get(key)
+        if result is not None:
+            QUERY_CACHE.labels("result", "hit").inc()
+            return list(result)
+        QUERY_CACHE.labels("result", "miss").inc()
+        result = search()
+        with self._results_lock:
+            self._results[key] = tuple(result)
+        return result
+
+    def search(self, query, k=3, nprobe: int = None, ef_search: int = None):
+        """
+        Hybrid search (dense only without a lexical index); `nprobe` (IVF) /
+        `ef_search` (HNSW) override the index defaults.
+        """
+        query = normalize_query(query)
+        return self._cached(("search", query, k, nprobe, ef_search),
+                            lambda: self._search(query, k, nprobe, ef_search))
+
+    def _search(self, query, k, nprobe, ef_search):
+        db = self.load_db()
+        if db is None:
+            raise ValueError("Database has not been built. Call build_db() with documents first.")
+        lexical = self.lexical
+        # Candidates for fusion and re-ranking, not just the final k
+        fetch_k = k
+        if lexical is not None:
+            fetch_k = max(fetch_k, self.fetch_k)
+        if self.reranker is not None:
+            fetch_k = max(fetch_k, self.reranker.top_n)
+        params = search_params(db.index, nprobe=nprobe, ef_search=ef_search)
+        with timed("embed_query"):
+            vector = np.array([self.embedding.embed_query(query)], dtype=np.float32)
+        with self._snapshot_lock.read():
+            with timed("faiss_search"):
+                _, indices = db.index.search(vector, fetch_k, params=params)
+            ranked = [db.index_to_docstore_id[i] for i in indices[0] if i != -1]
+            if lexical is not None:
+                with timed("lexical_search"):
+                    positions = self._positions(db)
+                    # A writer may swap the snapshots between the two reads: keep ids of `db` only
+                    keyword = [id_ for id_, _ in lexical.search(query, fetch_k) if id_ in positions]
+                ranked = reciprocal_rank_fusion([ranked, keyword])[:fetch_k]
+            if self.reranker is None:
+                ranked = ranked[:k]
+            docs = [db.docstore.search(id_) for id_ in ranked]
+        if self.reranker is not None:
+            docs = self.reranker.rerank(query, docs)[:k]
+        return docs
+
+    def _positions(self, db: FAISS) -> Dict[str, int]:
+        """
+        Docstore id -> FAISS position for the snapshot `db`, built once per
+        snapshot and extended as chunks are appended to it.
+        """
+        cached = self._position_map
+        if cached is None or cached[0] is not db:
+            cached = self._position_map = (db, {id_: pos for pos, id_ in db.index_to_docstore_id.items()})
+        positions, mapping = cached[1], db.index_to_docstore_id
+        for pos in range(len(positions), len(mapping)):
+            positions[mapping[pos]] = pos
+        return positions
+
+    def _allowed_positions(self, db: FAISS, sources) -> np.ndarray:
+        positions = self._positions(db)
+        ids = (id_ for source in sources for id_ in self.manifest.ids_for(source))
+        return np.array(sorted(positions[id_] for id_ in ids if id_ in positions), dtype=np.int64)
+
+    def _group(self, db: FAISS, hits, per_candidate: int, wanted, docs: dict):
+        """Group (position, distance) hits by source, best first; `docs` caches decoded chunks."""
+        groups = {}
+        for pos, distance in hits:
+            doc = docs.get(pos)
+            if doc is None:
+                doc = docs[pos] = db.docstore.search(db.index_to_docstore_id[pos])
+            source = source_key(doc.metadata.get("source", ""))
+            if wanted is not None and source not in wanted:
+                continue
+            chunks = groups.setdefault(source, [])
+            if len(chunks) < per_candidate:
+                chunks.append((doc, distance))
+        return list(groups.items())
+
+    def search_candidates(self, query, k: int = 5, sources=None, chunks_per_candidate: int = 2,
+                          nprobe: int = None, ef_search: int = None, prefilter_ratio: float = 0.2):
+        """
+        Similarity search grouped by candidate (source file): up to `k`
+        (source, [(Document, distance)]) pairs, best first, with the
+        `chunks_per_candidate` closest chunks of each candidate.
+
+        With `sources`, only those candidates are searched. When their chunks
+        are at most `prefilter_ratio` of the index, the search is restricted to
+        them up front (FAISS id selector, or an exact scan for HNSW, whose graph
+        walk misses hits under selective filters). Otherwise the hits of other
+        candidates are dropped and the search is oversampled until `k`
+        candidates are found.
+        """
+        query = normalize_query(query)
+        key = ("candidates", query, k, frozenset(sources) if sources is not None else None,
+               chunks_per_candidate, nprobe, ef_search, prefilter_ratio)
+        return self._cached(key, lambda: self._search_candidates(
+            query, k, sources, chunks_per_candidate, nprobe, ef_search, prefilter_ratio))
+
+    def _search_candidates(self, query, k, sources, chunks_per_candidate, nprobe, ef_search, prefilter_ratio):
+        db = self.load_db()
+        if db is None:
+            raise ValueError("Database has not been built. Call build_db() with documents first.")
+        if sources is not None and not sources:
+            return []
+        with timed("embed_query"):
+            vector = np.array([self.embedding.embed_query(query)], dtype=np.float32)
+        with self._snapshot_lock.read():
+            if db.index.ntotal == 0:
+                return []
+            wanted = {source_key(source) for source in sources} if sources is not None else None
+            allowed = None
+            if wanted is not None and self.manifest is not None:
+                allowed = self._allowed_positions(db, wanted)
+                if len(allowed) == 0:
+                    return []
+                if len(allowed) > prefilter_ratio * db.index.ntotal:
+                    allowed = None
+            docs = {}
+            with timed("faiss_search"):
+                if allowed is not None and isinstance(db.index, faiss.IndexHNSW) and len(allowed) <= EXACT_SCAN_MAX:
+                    distances = ((db.index.reconstruct_batch(allowed) - vector) ** 2).sum(axis=1)
+                    order = np.argsort(distances)
+                    hits = [(int(allowed[i]), float(distances[i])) for i in order]
+                    return self._group(db, hits, chunks_per_candidate, wanted, docs)[:k]
+                limit = len(allowed) if allowed is not None else db.index.ntotal
+                sel = faiss.IDSelectorBatch(allowed) if allowed is not None else None
+                fetch_k = k * chunks_per_candidate * 4
+                while True:
+                    fetch_k = min(fetch_k, limit)
+                    ef = ef_search
+                    if sel is not None and isinstance(db.index, faiss.IndexHNSW):
+                        ef = max(ef_search or db.index.hnsw.efSearch, fetch_k)
+                    params = search_params(db.index, nprobe=nprobe, ef_search=ef, sel=sel)
+                    distances, indices = db.index.search(vector, fetch_k, params=params)
+                    hits = [(int(i), float(d)) for i, d in zip(indices[0], distances[0]) if i != -1]
+                    groups = self._group(db, hits, chunks_per_candidate, wanted, docs)
+                    if len(groups) >= k or fetch_k >= limit:
+                        return groups[:k]
+                    fetch_k *= 4
 
     def get_retriever(self, k=3):
-        if self.db is None:
-            if os.path.exists(self.persist_dir):
-                self.db = FAISS.load_local(self.persist_dir, self.embedding, allow_dangerous_deserialization=True)
-            else:
-                raise ValueError("Database has not been built.")
-        return self.db.as_retriever(search_kwargs={"k": k})
+        if self.load_db() is None:
+            raise ValueError("Database has not been built.")
+        return RunnableLambda(lambda query: self.search(query, k=k))
@@ -0,0 +1,105 @@
+import importlib
+import multiprocessing
+import os
+import queue
+from typing import Callable, Iterable, Iterator, List
+
+
+def _warm_up():
+    # Pay the langchain/pypdf import cost once per worker, not on its first task
+    for module in ("src.rag.file_loader", "langchain_community.document_loaders.parsers.pdf", "bs4"):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+class _Inline:
+    """AsyncResult look-alike for work run in the calling thread."""
+    def __init__(self, fn: Callable, args: tuple) -> None:
+        self._fn, self._args = fn, args
+
+    def get(self, timeout: float = None):
+        return self._fn(*self._args)
+
+
+class WorkerPool:
+    """
+    Long-lived process pool for CPU-bound file parsing, started once by the
+    app and shared by every Loader, so uploads do not pay for spawning
+    processes and importing langchain/pypdf on each call.
+
+    - Sized to the CPU count (minus one for the event loop) unless `processes` is given.
+    - Batches of at most `inline_threshold` files are parsed in the calling thread.
+    - Large batches are sent to the workers in chunks; a caller passing
+      `workers` below the pool size keeps at most that many files in flight.
+    - Workers are replaced after `max_tasks_per_child` tasks, bounding memory
+      leaked by the PDF parser.
+    - Uses the "spawn" start method: the app runs threads (index writer,
+      embedding model), which do not survive a fork safely.
+    """
+    def __init__(self, processes: int = None, max_tasks_per_child: int = 100,
+                 inline_threshold: int = 1, context: str = "spawn") -> None:
+        self.processes = processes or max(1, (os.cpu_count() or 1) - 1)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.inline_threshold = inline_threshold
+        self.context = context
+        self._pool = None
+
+    def start(self):
+        if self._pool is None:
+            ctx = multiprocessing.get_context(self.context)
+            self._pool = ctx.Pool(self.processes, initializer=_warm_up,
+                                  maxtasksperchild=self.max_tasks_per_child)
+            # Small batches are parsed inline, in this process
+            _warm_up()
+        return self
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def runs_inline(self, n: int, workers: int = None) -> bool:
+        """Whether a batch of `n` files is cheaper to parse in the calling thread."""
+        return n <= self.inline_threshold or (workers is not None and workers <= 1)
+
+    def imap_unordered(self, fn: Callable, items: List, workers: int = None) -> Iterator:
+        """Results of `fn` over `items`, in completion order, on at most `workers` processes."""
+        if self._pool is None or self.runs_inline(len(items), workers):
+            return map(fn, items)
+        if workers is not None and workers < self.processes:
+            return self._imap_bounded(fn, items, workers)
+        chunksize = max(1, len(items) // (self.processes * 4))
+        return self._pool.imap_unordered(fn, items, chunksize)
+
+    def _imap_bounded(self, fn: Callable, items: List, workers: int) -> Iterator:
+        # One task per item, the next one sent when a result comes back
+        done = queue.Queue()
+        items = iter(items)
+        running = 0
+
+        def submit():
+            item = next(items, done)
+            if item is done:
+                return 0
+            self._pool.apply_async(fn, (item,), callback=lambda value: done.put((True, value)),
+                                   error_callback=lambda error: done.put((False, error)))
+            return 1
+
+        for _ in range(workers):
+            running += submit()
+        while running:
+            ok, value = done.get()
+            running -= 1
+            if not ok:
+                raise value
+            running += submit()
+            yield value
+
+    def apply_async(self, fn: Callable, args: Iterable = (), inline: bool = False):
+        """Run `fn(*args)` on a worker; the result's `get()` returns its value."""
+        if inline or self._pool is None:
+            return _Inline(fn, tuple(args))
+        return self._pool.apply_async(fn, tuple(args))
@@ -5,6 +5,17 @@ import os
 import chat.output_parser as output_parser
 API_URL = "http://localhost:5000"  # Change if deployed
 
+
+def sse_events(response):
+    """(event, data) pairs of a Server-Sent Events response, data JSON-decoded."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+            event = "message"
+
 st.set_page_config(page_title="CV Analyzer", layout="centered")
 st.title("\U0001F4DA CV Upload and Candidate Search")
 
@@ -18,32 +29,47 @@ uploaded_files = st.file_uploader(
 drive_link = st.text_input("or Paste a Google Drive link")
 
 if st.button("Upload & Extract"):
-    with st.spinner("Uploading and processing..."):
-        data = {"drive_link": drive_link} if drive_link else {}
-
-        files = []
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-                files.append(
-                    ("file", (uploaded_file.name, uploaded_file.getvalue(), "application/pdf"))
-                )
-
-        try:
-            if files:
-                response = requests.post(f"{API_URL}/upload_cv", files=files, data=data)
-            else:
-                response = requests.post(f"{API_URL}/upload_cv", data=data)
-
-            result = response.json()
-            extracted = result.get("extracted", [])
-            st.session_state["extracted_candidates"] = extracted
-            st.session_state["last_export_path"] = None  # Reset previous export path
-
-            st.success("CV processed successfully!")
-            st.json(result)
-
-        except Exception as e:
-            st.error(f"Failed to upload: {e}")
+    data = {"drive_link": drive_link} if drive_link else {}
+
+    files = []
+    if uploaded_files:
+        for uploaded_file in uploaded_files:
+            files.append(
+                ("file", (uploaded_file.name, uploaded_file.getvalue(), "application/pdf"))
+            )
+
+    try:
+        # Candidates are shown as soon as each extraction finishes
+        status = st.status("Uploading and indexing...")
+        extracted = {}
+        with requests.post(f"{API_URL}/upload_cv", params={"stream": "true"},
+                           files=files or None, data=data, stream=True) as response:
+            response.raise_for_status()
+            for event, payload in sse_events(response):
+                if event == "job":
+                    status.update(label=f"Queued as job {payload['job_id']}...")
+                elif event == "duplicate":
+                    st.info(f"{payload['file']} was already uploaded")
+                    if payload["profile"]:
+                        extracted[f"duplicate-{payload['source']}"] = payload["profile"]
+                elif event == "indexed":
+                    status.update(label=f"Indexed {payload['chunks']} chunk(s), extracting...")
+                elif event == "candidate":
+                    extracted[payload["index"]] = payload["record"]
+                    status.update(label=f"Extracted {len(extracted)} candidate(s)...")
+                    st.json(payload["record"], expanded=False)
+                elif event == "failed":
+                    st.warning(f"{payload['file'] or payload['source']}: {payload['detail']}")
+                elif event == "error":
+                    raise RuntimeError(payload["detail"])
+        status.update(label=f"Extracted {len(extracted)} candidate(s)", state="complete")
+
+        st.session_state["extracted_candidates"] = [extracted[i] for i in sorted(extracted, key=str)]
+        st.session_state["last_export_path"] = None  # Reset previous export path
+        st.success("CV processed successfully!")
+
+    except Exception as e:
+        st.error(f"Failed to upload: {e}")
 
 # --- Export Section ---
 st.header("Export Candidates")
@@ -74,16 +100,35 @@ if st.button("Export Candidates"):
 # --- Search Section ---
 st.header("Search Candidates")
 search_query = st.text_input("Search by skills, job description, etc.")
+with st.expander("Filters"):
+    filter_skills = st.text_input("Required skills (comma separated)")
+    filter_certifications = st.text_input("Required certifications (comma separated)")
+    filter_min_years = st.number_input("Minimum years of experience", min_value=0.0, value=0.0, step=1.0)
+    filter_degree = st.selectbox("Minimum degree", ["", "associate", "bachelor", "master", "phd"])
+    filter_location = st.text_input("Location")
 if st.button("Search") and search_query:
     with st.spinner("Searching candidates..."):
         try:
-            response = requests.post(f"{API_URL}/search_candidates", json={"query": search_query})
+            search_filter = {
+                "skills": [s.strip() for s in filter_skills.split(",") if s.strip()] or None,
+                "certifications": [c.strip() for c in filter_certifications.split(",") if c.strip()] or None,
+                "min_years": filter_min_years or None,
+                "degree": filter_degree or None,
+                "location": filter_location or None,
+            }
+            response = requests.post(f"{API_URL}/search_candidates",
+                                     json={"query": search_query, "filter": search_filter})
+            response.raise_for_status()
             result = response.json()
-            st.success(f"Found {len(result['matches'])} match(es)")
-            for i, match in enumerate(result['matches'], 1):
-                st.subheader(f"Match #{i}")
-                st.write(match['text'])
-                st.caption(f"Metadata: {match['metadata']}")
+            st.success(f"Found {len(result['candidates'])} candidate(s)")
+            for i, candidate in enumerate(result['candidates'], 1):
+                profile = candidate['profile'] or {}
+                st.subheader(f"#{i} {profile.get('full_name') or os.path.basename(candidate['source'])}")
+                if profile:
+                    st.caption(f"{profile.get('location') or ''} {profile.get('email') or ''}")
+                for match in candidate['matches']:
+                    st.write(match['text'])
+                st.caption(f"Source: {candidate['source']} (distance {candidate['score']:.3f})")
         except Exception as e:
             st.error(f"Search failed: {e}")
 
@@ -91,11 +136,19 @@ if st.button("Search") and search_query:
 st.header("Ask a Question")
 question = st.text_input("Enter your question")
 if st.button("Ask") and question:
-    with st.spinner("Getting answer..."):
-        try:
-            response = requests.post(f"{API_URL}/generative_ai", json={"question": question})
-            answer = response.json()["answer"]
+    def answer_chunks(response):
+        for event, payload in sse_events(response):
+            if event == "data":
+                yield payload
+            elif event == "error":
+                raise RuntimeError(payload["detail"])
+
+    try:
+        # The answer is written token by token as it is generated
+        with requests.post(f"{API_URL}/generative_ai", params={"stream": "true"},
+                           json={"question": question}, stream=True) as response:
+            response.raise_for_status()
             st.success("Answer:")
-            st.write(answer)
-        except Exception as e:
-            st.error(f"Question failed: {e}")
+            st.write_stream(answer_chunks(response))
+    except Exception as e:
+        st.error(f"Question failed: {e}")
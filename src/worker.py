@@ -0,0 +1,55 @@
+"""
+Ingestion worker for the multi-worker deployment: the single process that
+writes the candidate index. It indexes the corpus at startup, then runs the
+ingestion jobs queued by the API workers (INDEX_ROLE=reader) and flushes a new
+index generation every INDEX_FLUSH_INTERVAL seconds, which the API workers
+pick up.
+
+    python -m src.worker
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from src.base import metrics
+from src.base.llm_model import get_llm
+from src.rag.candidate_store import CandidateStore
+from src.rag.cv_extractor import CVExtractor
+from src.rag.extraction_cache import ExtractionCache
+from src.rag.index_manager import IndexManager
+from src.rag.jobs import JobRunner, JobStore
+from src.rag.worker_pool import WorkerPool
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("src").setLevel(logging.INFO)
+
+genai_docs = "./data_source/generative_ai"
+
+llm = get_llm(callbacks=[metrics.LLMMetrics()])
+extractor = CVExtractor(llm, cache=ExtractionCache("./cache/extraction.db"))
+candidates = CandidateStore("./cache/candidates.db")
+pool = WorkerPool()
+index = IndexManager(data_dir=genai_docs, data_type="pdf", workers=pool.processes, pool=pool,
+                     flush_interval=float(os.getenv("INDEX_FLUSH_INTERVAL", "5")), on_remove=candidates.delete)
+runner = JobRunner(JobStore("./cache/jobs.db"), index, extractor, candidates, upload_dir=genai_docs,
+                   workers=int(os.getenv("JOB_WORKERS", "2")))
+
+
+async def main():
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    pool.start()
+    index.start()
+    await runner.start()
+    print(f"Ingestion worker started ({runner.workers} job worker(s))")
+    await stopping.wait()
+    await runner.stop()
+    index.stop(timeout=30)
+    pool.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,14 @@
+import pytest
+
+from benchmarks.synthetic import fake_embeddings, generate_corpus
+
+
+@pytest.fixture
+def embeddings():
+    return fake_embeddings(size=64)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Three synthetic CV PDFs."""
+    return generate_corpus(str(tmp_path / "cvs"), 3, "pdf")
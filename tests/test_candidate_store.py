@@ -0,0 +1,59 @@
+import pytest
+
+from src.rag.candidate_store import CandidateFilter, CandidateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CandidateStore(str(tmp_path / "candidates.db"))
+    store.upsert([
+        {"source": "/cvs/a.pdf", "full_name": "A", "location": "Ha Noi",
+         "skills": ["Python", "SQL"], "certifications": ["AWS SAA"],
+         "education": [{"degree": "Master of Science", "school": "HUST"}],
+         "work_experience": [{"years": "2015 - 2020"}]},
+        {"source": "/cvs/b.pdf", "full_name": "B", "location": "100% remote",
+         "skills": [{"name": "python"}, "Docker"],
+         "education": [{"degree": "Bachelor", "school": "UET"}],
+         "work_experience": [{"years": "2019 - 2021"}]},
+        {"source": "/cvs/c.pdf", "full_name": "C", "location": "Ho_Chi_Minh",
+         "skills": ["Java"], "education": [], "work_experience": []},
+    ])
+    return store
+
+
+@pytest.mark.parametrize("criteria, expected", [
+    (CandidateFilter(), {"/cvs/a.pdf", "/cvs/b.pdf", "/cvs/c.pdf"}),
+    (CandidateFilter(skills=["PYTHON"]), {"/cvs/a.pdf", "/cvs/b.pdf"}),
+    (CandidateFilter(skills=["python", "sql"]), {"/cvs/a.pdf"}),
+    (CandidateFilter(certifications=["aws  saa"]), {"/cvs/a.pdf"}),
+    (CandidateFilter(min_years=3), {"/cvs/a.pdf"}),
+    (CandidateFilter(degree="bachelor"), {"/cvs/a.pdf", "/cvs/b.pdf"}),
+    (CandidateFilter(degree="phd"), set()),
+    (CandidateFilter(location="ha noi"), {"/cvs/a.pdf"}),
+    (CandidateFilter(skills=["python"], degree="msc"), {"/cvs/a.pdf"}),
+])
+def test_filter_sources(store, criteria, expected):
+    assert store.filter_sources(criteria) == expected
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("%", {"/cvs/b.pdf"}),
+    ("100%", {"/cvs/b.pdf"}),
+    ("_", {"/cvs/c.pdf"}),
+    ("ho_chi", {"/cvs/c.pdf"}),
+    ("ho chi", set()),
+])
+def test_location_is_a_literal_substring(store, location, expected):
+    assert store.filter_sources(CandidateFilter(location=location)) == expected
+
+
+def test_unknown_degree(store):
+    with pytest.raises(ValueError):
+        store.filter_sources(CandidateFilter(degree="wizard"))
+
+
+def test_delete_drops_profile_and_terms(store):
+    store.delete(["/cvs/a.pdf"])
+    assert len(store) == 2
+    assert store.get(["/cvs/a.pdf"]) == {}
+    assert store.filter_sources(CandidateFilter(skills=["python"])) == {"/cvs/b.pdf"}
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from benchmarks.synthetic import FakeCVChatModel
+from src.rag.candidate_store import CandidateStore
+from src.rag.cv_extractor import CVExtractor
+from src.rag.index_manager import IndexManager
+from src.rag.jobs import DONE, FAILED, QUEUED, RUNNING, JobRunner, JobStore
+from src.rag.sources import source_hash
+
+
+def run_job(runner: JobRunner, files):
+    async def run():
+        await runner.start()
+        try:
+            job_id, _ = runner.store.submit(files, key="job")
+            runner.notify()
+            return await asyncio.wait_for(runner.wait(job_id, interval=0.1), 60)
+        finally:
+            await runner.stop()
+    return asyncio.run(run())
+
+
+def test_corrupt_file_fails_alone(tmp_path, corpus, embeddings):
+    bad = tmp_path / "cvs" / "bad.pdf"
+    bad.write_bytes(b"%PDF-1.4\ngarbage")
+    index = IndexManager(data_dir=str(tmp_path / "uploads"), persist_dir=str(tmp_path / "vectorstore"),
+                         workers=1, embedding_model=embeddings, flush_interval=60)
+    index.start()
+    try:
+        while index.db is None:
+            time.sleep(0.01)
+        runner = JobRunner(JobStore(str(tmp_path / "jobs.db")), index, CVExtractor(FakeCVChatModel()),
+                           CandidateStore(str(tmp_path / "candidates.db")), upload_dir=str(tmp_path / "uploads"))
+        files = [(path.split("/")[-1], path, source_hash(path)) for path in [corpus[0], str(bad)]]
+        job = run_job(runner, files)
+    finally:
+        index.stop()
+
+    assert job["status"] == DONE
+    status = {file["name"]: (file["status"], file["error"]) for file in job["files"]}
+    assert status[corpus[0].split("/")[-1]] == ("extracted", None)
+    assert status["bad.pdf"][0] == "failed"
+    assert status["bad.pdf"][1]
+    # The corrupt file is not recorded as indexed, so a later sync tries it again
+    assert not index.indexed(str(bad), source_hash(str(bad)))
+
+
+def test_claim_takes_the_oldest_job_once(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    first, created = store.submit([("a.pdf", "/cvs/a.pdf", "a")], key="first")
+    second, _ = store.submit([("b.pdf", "/cvs/b.pdf", "b")], key="second")
+    assert created
+    assert store.submit([], key="first") == (first, False)
+
+    assert store.claim()["id"] == first
+    assert store.claim()["id"] == second
+    assert store.claim() is None
+    assert store.get(first)["status"] == RUNNING
+
+
+def test_expired_lease_requeues_until_max_attempts(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), lease=0, max_attempts=2)
+    job_id, _ = store.submit([("a.pdf", "/cvs/a.pdf", "a")])
+    assert store.claim()["attempts"] == 1
+    time.sleep(0.01)
+    # The worker died without a heartbeat: the next claim takes the job again
+    assert store.claim()["attempts"] == 2
+    time.sleep(0.01)
+    assert store.claim() is None
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"] == "worker lost"
+
+
+def test_resubmitting_a_key_retries_failed_files(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    files = [("a.pdf", "/cvs/a.pdf", "a"), ("b.pdf", "/cvs/b.pdf", "b")]
+    job_id, _ = store.submit(files, key="upload")
+    store.claim()
+    store.update_file(job_id, 0, "extracted", record={"source": "/cvs/a.pdf", "full_name": "A"})
+    store.update_file(job_id, 1, FAILED, error="PdfStreamError: bad")
+    store.finish(job_id, DONE)
+
+    assert store.submit(files, key="upload") == (job_id, False)
+    job = store.get(job_id)
+    assert job["status"] == QUEUED
+    assert [file["status"] for file in job["files"]] == ["extracted", QUEUED]
+    assert job["files"][1]["error"] is None
+    assert store.claim()["attempts"] == 1
+
+
+def test_finished_job_releases_its_key_without_reuse(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id, _ = store.submit([], drive_link="https://drive/folder", key="https://drive/folder")
+    store.claim()
+    store.finish(job_id, DONE)
+    new_id, created = store.submit([], drive_link="https://drive/folder", key="https://drive/folder",
+                                   reuse_finished=False)
+    assert created and new_id != job_id
+    assert store.get(job_id)["status"] == DONE
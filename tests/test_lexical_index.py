@@ -0,0 +1,22 @@
+from src.rag.lexical_index import reciprocal_rank_fusion
+
+
+def test_rrf_rewards_agreement():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]]) == ["b", "a", "d", "c"]
+
+
+def test_rrf_single_ranking_keeps_its_order():
+    assert reciprocal_rank_fusion([["x", "y", "z"]]) == ["x", "y", "z"]
+
+
+def test_rrf_k_weighs_top_ranks():
+    rankings = [["a", "x", "m"], ["b", "y", "m"]]
+    # A large k flattens the ranks: third in both beats first in one
+    assert reciprocal_rank_fusion(rankings, k=60)[0] == "m"
+    # A small k lets a first place win
+    assert reciprocal_rank_fusion(rankings, k=0)[:2] == ["a", "b"]
+
+
+def test_rrf_empty():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
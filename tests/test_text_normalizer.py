@@ -0,0 +1,42 @@
+import pytest
+
+from src.rag.text_normalizer import NormalizationPolicy, normalize_text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("  Python\t\tdeveloper  \n\n\n\nSQL \n Docker ", "Python developer\n\nSQL\nDocker"),
+    ("line\r\nbreaks\rhere", "line\nbreaks\nhere"),
+    ("null\x00 and bell\x07", "null and bell"),
+    ("ofﬁce ﬂow", "office flow"),
+    ("Ｐｙｔｈｏｎ", "Python"),
+    ("non\u00a0breaking\u2003space", "non breaking space"),
+    ("zero\u200bwidth soft\u00adhyphen\ufeff", "zerowidth softhyphen"),
+    ("para\u2028graph", "para\ngraph"),
+    ("Nguyễn Văn A, Hà Nội", "Nguyễn Văn A, Hà Nội"),
+    # Decomposed accents are composed
+    ("Nguye\u0302\u0303n", "Nguy\u1ec5n"),
+])
+def test_default_policy(text, expected):
+    assert normalize_text(text) == expected
+
+
+def test_clean_ascii_is_unchanged():
+    text = "Senior engineer\n\nSkills: Python, SQL"
+    assert normalize_text(text) == text
+
+
+def test_ascii_only_drops_non_ascii():
+    policy = NormalizationPolicy(unicode_form="NFKD", ascii_only=True)
+    assert normalize_text("Hà Nội café", policy) == "Ha Noi cafe"
+
+
+def test_nfc_keeps_compatibility_characters_but_fixes_ligatures():
+    policy = NormalizationPolicy(unicode_form="NFC")
+    assert normalize_text("ﬁle Ａ", policy) == "file Ａ"
+
+
+def test_everything_off_keeps_the_text():
+    policy = NormalizationPolicy(unicode_form=None, fix_ligatures=False,
+                                 strip_invisible=False, collapse_whitespace=False)
+    text = "  a\u200bﬁ\t\x00 \n\n\n"
+    assert normalize_text(text, policy) == text
@@ -0,0 +1,29 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from src.rag.uploads import store_upload
+
+
+def test_stores_pdf_under_its_hash(tmp_path):
+    data = b"%PDF-1.4\n" + b"x" * 100
+    path, digest, new = store_upload(io.BytesIO(data), str(tmp_path), "cv.pdf")
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert path == os.path.join(str(tmp_path), f"{digest}.pdf")
+    assert new
+    assert store_upload(io.BytesIO(data), str(tmp_path), "copy.pdf") == (path, digest, False)
+    assert os.listdir(tmp_path) == [f"{digest}.pdf"]
+
+
+def test_accepts_header_after_leading_bytes(tmp_path):
+    _, _, new = store_upload(io.BytesIO(b"\xef\xbb\xbf  %PDF-1.7\n..."), str(tmp_path), "cv.pdf")
+    assert new
+
+
+@pytest.mark.parametrize("data", [b"", b"PK\x03\x04 not a pdf", b"<html>%PDF-</html>".rjust(2048)])
+def test_rejects_non_pdf(tmp_path, data):
+    with pytest.raises(ValueError, match="cv.pdf is not a PDF file"):
+        store_upload(io.BytesIO(data), str(tmp_path), "cv.pdf")
+    assert os.listdir(tmp_path) == []
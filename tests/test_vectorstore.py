@@ -0,0 +1,73 @@
+import pytest
+from langchain_core.documents import Document
+
+from src.rag.ann_index import INDEX_TYPES, IndexConfig, index_type_of
+from src.rag.file_loader import Loader
+from src.rag.vectorstore import CandidateDB
+
+
+def chunks(n: int, source: str):
+    return [Document(page_content=f"{source} chunk {i}: python, sql, docker", metadata={"source": source})
+            for i in range(n)]
+
+
+def make_db(path, embeddings, index_type: str):
+    # Small enough to train IVF (2 lists) and PQ (4-bit codes) on a few hundred chunks
+    config = IndexConfig(index_type=index_type, nlist=2, pq_m=8, pq_nbits=4)
+    return CandidateDB(persist_dir=str(path), embedding_model=embeddings, index_config=config)
+
+
+def stored_ids(db: CandidateDB):
+    return set(db.db.index_to_docstore_id.values())
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_add_delete_flush_reload(tmp_path, embeddings, index_type):
+    db = make_db(tmp_path, embeddings, index_type)
+    first = db.build_db(chunks(200, "a.pdf"))
+    assert index_type_of(db.db.index) == index_type
+    second = db.add_documents(chunks(10, "b.pdf"))
+    db.delete(first[:50])
+    assert db.db.index.ntotal == 160
+    assert stored_ids(db) == set(first[50:] + second)
+    assert "b.pdf chunk 3" in db.search("b.pdf chunk 3: python, sql, docker", k=1)[0].page_content
+
+    reloaded = make_db(tmp_path, embeddings, index_type)
+    reloaded.load_db()
+    assert reloaded.db.index.ntotal == 160
+    assert stored_ids(reloaded) == set(first[50:] + second)
+
+    db.delete(first[50:] + second)
+    assert db.db.index.ntotal == 0
+    assert db.search("python", k=3) == []
+    reloaded = make_db(tmp_path, embeddings, index_type)
+    reloaded.load_db()
+    assert reloaded.db.index.ntotal == 0
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_pruned_sources_leave_the_index(tmp_path, corpus, embeddings, index_type):
+    removed = []
+    db = make_db(tmp_path / "vectorstore", embeddings, index_type)
+    db.on_remove = removed.extend
+    loader = Loader("pdf")
+    assert db.sync(corpus, loader, prune=True)
+    version = db.version
+
+    db.sync(corpus[:1], loader, prune=True)
+    assert sorted(removed) == sorted(corpus[1:])
+    assert {source for source, _ in db.search_candidates("python", k=5)} == {corpus[0]}
+
+    db.sync([], loader, prune=True)
+    assert db.db.index.ntotal == 0
+    assert db.search_candidates("python", k=5) == []
+    assert db.version > version
+
+
+def test_unchanged_sync_is_a_noop(tmp_path, corpus, embeddings):
+    db = make_db(tmp_path, embeddings, "flat")
+    loader = Loader("pdf")
+    db.sync(corpus, loader, prune=True)
+    version = db.version
+    assert db.sync(corpus, loader, prune=True) == []
+    assert db.version == version
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from src.rag.worker_pool import WorkerPool
+
+
+def span(_):
+    start = time.monotonic()
+    time.sleep(0.2)
+    return start, time.monotonic()
+
+
+def fail(item):
+    raise ValueError(item)
+
+
+def max_overlap(spans):
+    events = sorted([(start, 1) for start, _ in spans] + [(end, -1) for _, end in spans])
+    running = peak = 0
+    for _, step in events:
+        running += step
+        peak = max(peak, running)
+    return peak
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(processes=4, context=None).start()
+    yield pool
+    pool.stop()
+
+
+def test_workers_caps_concurrency(pool):
+    spans = list(pool.imap_unordered(span, range(6), workers=2))
+    assert len(spans) == 6
+    assert max_overlap(spans) == 2
+
+
+def test_bounded_map_raises_task_error(pool):
+    with pytest.raises(ValueError):
+        list(pool.imap_unordered(fail, range(3), workers=2))